@@ -0,0 +1,70 @@
+from . import subscriptions
+from .backends import redis
+from .local_cache import LocalCache
+from django.conf import settings
+from django.db import transaction
+import json
+
+# Per process cache of resource id -> (type, materialized path), the only
+# fields locking needs. Every process listens on this channel for the
+# resources that were moved, retyped or deleted
+CHANNEL = "resource_ancestry_invalidations"
+
+entries = LocalCache()
+
+
+def get(resource_id):
+    if not listener.is_ready():
+        return None
+    return entries.get(resource_id)
+
+
+def get_version():
+    # Passed back to add, lookups that raced with an invalidation are not
+    # cached
+    return entries.version
+
+
+def add(resource, since):
+    if not listener.ready.is_set():
+        return
+
+    config = settings.RESOURCE_ANCESTRY_CACHE
+    entries.set(
+        resource.id,
+        (resource.type, resource.path),
+        config["TTL"],
+        config["SIZE"],
+        since,
+    )
+
+
+def apply(ids=(), paths=()):
+    entries.delete_many(ids)
+    if paths:
+        # A moved resource takes its whole subtree along
+        paths = tuple(paths)
+        entries.delete_matching(lambda _, value: value[1].startswith(paths))
+
+
+def invalidate(ids=(), paths=()):
+    # Dropped here right away, and in every other process once committed.
+    # Best effort, a failed publish is logged and the write stands, entries
+    # of the other processes expire after the TTL
+    ids, paths = list(ids), list(paths)
+    apply(ids, paths)
+    message = json.dumps({"ids": ids, "paths": paths})
+    transaction.on_commit(
+        lambda: redis.get_client().publish(CHANNEL, message), robust=True
+    )
+
+
+def clear():
+    entries.clear()
+
+
+def handle(channel, data):
+    apply(**json.loads(data))
+
+
+listener = subscriptions.Listener("resource-ancestry", lambda: [CHANNEL], handle, clear)
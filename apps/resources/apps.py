@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class ResourcesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.resources"
+
+    def ready(self):
+        from . import metrics, profiling
+
+        connection_created.connect(profiling.install_query_timer)
+        connection_created.connect(metrics.install_query_counter)
@@ -0,0 +1,181 @@
+from . import ancestry, events, locks
+from .models import Resource
+from .serializers import LockSerializer, RenewLockSerializer
+from .views import LOCK_ERRORS
+from apps.users import authentication
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.authtoken.models import Token
+import functools, json
+
+
+async def get_user(request):
+    # Same token credentials and token cache as the DRF API
+    keyword, _, key = request.headers.get("Authorization", "").partition(" ")
+    if keyword != "Token" or not key:
+        return None
+    return await sync_to_async(authenticate)(key)
+
+
+def authenticate(key):
+    user = authentication.get_cached_user(key)
+    if user is not None:
+        return user
+
+    try:
+        token = Token.objects.select_related("user").get(key=key)
+    except Token.DoesNotExist:
+        return None
+    if not token.user.is_active:
+        return None
+    authentication.cache_user(key, token.user)
+    return token.user
+
+
+def authentication_failed():
+    return JsonResponse(
+        {"detail": "Authentication credentials were not provided."}, status=401
+    )
+
+
+def lock_view(view):
+    @csrf_exempt
+    @functools.wraps(view)
+    async def wrapper(request, pk):
+        user = await get_user(request)
+        if user is None:
+            return authentication_failed()
+
+        cached = ancestry.get(pk)
+        if cached is not None:
+            resource = Resource.from_db(
+                "default", ["id", "type", "path"], [pk, *cached]
+            )
+        else:
+            since = ancestry.get_version()
+            try:
+                resource = await Resource.objects.only("id", "type", "path").aget(pk=pk)
+            except Resource.DoesNotExist:
+                return JsonResponse(
+                    {"detail": "No Resource matches the given query."}, status=404
+                )
+            ancestry.add(resource, since)
+
+        try:
+            if request.content_type == "application/json":
+                data = json.loads(request.body or b"{}")
+            else:
+                data = request.POST
+        except ValueError:
+            return JsonResponse({"detail": "JSON parse error."}, status=400)
+
+        return await view(request, user, resource, data)
+
+    return wrapper
+
+
+@require_POST
+@lock_view
+async def lock(request, user, resource, data):
+    serializer = LockSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    timeout = locks.get_timeout(resource, serializer.validated_data.get("ttl"))
+    if serializer.validated_data["wait"]:
+        result, lock_data = await locks.await_for_lock(
+            resource, user.id, timeout, serializer.validated_data["wait"]
+        )
+    else:
+        result, lock_data = await locks.aacquire_lock(
+            resource, timeout, locks.new_lock(user.id, resource.id, timeout)
+        )
+
+    if result != locks.OK:
+        return JsonResponse({"error": LOCK_ERRORS[result]}, status=403)
+
+    return JsonResponse(
+        {
+            "lock_code": lock_data.get("lock_code"),
+            "expires_at": lock_data.get("expires_at"),
+        }
+    )
+
+
+@require_POST
+@lock_view
+async def unlock(request, user, resource, data):
+    result = await locks.arelease_lock(resource, user.id, data.get("lock_code"))
+
+    if result != locks.OK:
+        return JsonResponse({"error": LOCK_ERRORS[result]}, status=403)
+
+    return JsonResponse({"message": "Resource unlocked successfully."})
+
+
+@require_POST
+@lock_view
+async def renew(request, user, resource, data):
+    serializer = RenewLockSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    timeout = locks.get_timeout(resource, serializer.validated_data.get("ttl"))
+    result, lock_data = await locks.arenew_lock(
+        resource, user.id, serializer.validated_data["lock_code"], timeout
+    )
+
+    if result != locks.OK:
+        return JsonResponse({"error": LOCK_ERRORS[result]}, status=403)
+
+    return JsonResponse(
+        {
+            "lock_code": lock_data.get("lock_code"),
+            "expires_at": lock_data.get("expires_at"),
+        }
+    )
+
+
+@require_GET
+@lock_view
+async def lock_status(request, user, resource, data):
+    return JsonResponse(locks.get_status(resource, await locks.afind_lock(resource)))
+
+
+async def event_stream(ids, subtree):
+    async for event in events.lock_events(ids, subtree):
+        if event is None:
+            yield ": keep-alive\n\n"
+        else:
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+
+@require_GET
+async def lock_events(request):
+    if await get_user(request) is None:
+        return authentication_failed()
+
+    try:
+        ids = [int(pk) for pk in request.GET.get("ids", "").split(",") if pk]
+        subtree = request.GET.get("subtree")
+        subtree = int(subtree) if subtree else None
+    except ValueError:
+        return JsonResponse(
+            {"detail": "ids and subtree must be resource ids."}, status=400
+        )
+
+    # WSGI handlers collect async streams before sending them, an endless one
+    # would never send anything and hold its worker
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"detail": "Lock events are only served by an ASGI server."}, status=501
+        )
+
+    return StreamingHttpResponse(
+        event_stream(ids, subtree),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,13 @@
+from .base import LockBackend, TreeLockBackend
+from django.conf import settings
+from django.utils.module_loading import import_string
+import functools
+
+
+@functools.cache
+def load_backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    return load_backend(settings.RESOURCE_LOCK_BACKEND)
@@ -0,0 +1,218 @@
+from .. import locks
+from asgiref.sync import sync_to_async
+from django.conf import settings
+import asyncio, time, uuid
+
+# Seconds between the attempts of a waiting lock request, on engines without
+# wake up signals
+POLL_INTERVAL = 0.1
+
+
+class LockBackend:
+    # Lock engine, chosen with the RESOURCE_LOCK_BACKEND setting. Resources
+    # only need their id, type and path loaded, results use the codes of the
+    # locks module. Async methods run the sync ones in a thread unless an
+    # engine has native ones
+
+    def acquire_locks(self, items, atomic=False):
+        # (result, lock record or holder) for every (resource, timeout, lock
+        # record) item
+        raise NotImplementedError
+
+    def release_locks(self, items, user_id, atomic=False):
+        # Result for every (resource, lock code) item
+        raise NotImplementedError
+
+    def check_locks(self, items, user_id):
+        # Result release_locks would give every item, nothing is released
+        raise NotImplementedError
+
+    def renew_lock(self, resource, user_id, lock_code, timeout):
+        raise NotImplementedError
+
+    def find_locks(self, resources):
+        # Nearest lock on every resource or its ancestors, by resource id
+        raise NotImplementedError
+
+    def has_locked_children(self, resource):
+        raise NotImplementedError
+
+    def wait_for_lock(self, resource, user_id, timeout, wait):
+        deadline = time.time() + min(wait, settings.RESOURCE_LOCKS["MAX_WAIT"])
+        lock_code = str(uuid.uuid4())
+
+        while True:
+            lock_data = locks.new_lock(user_id, resource.id, timeout, lock_code)
+            [(result, holder)] = self.acquire_locks([(resource, timeout, lock_data)])
+            remaining = deadline - time.time()
+            if result == locks.OK or remaining <= 0:
+                return result, holder
+            time.sleep(min(remaining, POLL_INTERVAL))
+
+    async def aacquire_locks(self, items, atomic=False):
+        return await sync_to_async(self.acquire_locks)(items, atomic)
+
+    async def arelease_locks(self, items, user_id, atomic=False):
+        return await sync_to_async(self.release_locks)(items, user_id, atomic)
+
+    async def arenew_lock(self, resource, user_id, lock_code, timeout):
+        return await sync_to_async(self.renew_lock)(
+            resource, user_id, lock_code, timeout
+        )
+
+    async def afind_locks(self, resources):
+        return await sync_to_async(self.find_locks)(resources)
+
+    async def await_for_lock(self, resource, user_id, timeout, wait):
+        deadline = time.time() + min(wait, settings.RESOURCE_LOCKS["MAX_WAIT"])
+        lock_code = str(uuid.uuid4())
+
+        while True:
+            lock_data = locks.new_lock(user_id, resource.id, timeout, lock_code)
+            [(result, holder)] = await self.aacquire_locks(
+                [(resource, timeout, lock_data)]
+            )
+            remaining = deadline - time.time()
+            if result == locks.OK or remaining <= 0:
+                return result, holder
+            await asyncio.sleep(min(remaining, POLL_INTERVAL))
+
+
+class TreeLockBackend(LockBackend):
+    # Engines that store plain lock records and check the locking rules here,
+    # while holding a lock on the trees of the resources involved
+
+    def lock_trees(self, resources):
+        # Context manager serializing the lock changes within these trees
+        raise NotImplementedError
+
+    def get_locks(self, ids, now):
+        # Unexpired lock records of these resources, by resource id
+        raise NotImplementedError
+
+    def get_child_lock(self, resource, now):
+        # Id of a locked descendant of the resource, if any
+        raise NotImplementedError
+
+    def set_lock(self, resource, lock_data):
+        raise NotImplementedError
+
+    def delete_locks(self, ids):
+        raise NotImplementedError
+
+    def find_nearest(self, resource, now):
+        # Nearest lock on the resource or its ancestors and its distance
+        current = self.get_locks(resource.lineage, now)
+        for index, resource_id in enumerate(resource.lineage):
+            if resource_id in current:
+                return index, current[resource_id]
+        return None, None
+
+    def check_holder(self, index, lock_data, user_id, lock_code):
+        if lock_data["user_id"] != user_id:
+            return locks.HELD_BY_OTHER_USER
+        elif locks.lock_code_bytes(lock_data["lock_code"]) != locks.lock_code_bytes(
+            lock_code
+        ):
+            return locks.WRONG_LOCK_CODE
+        elif index > 0:
+            return locks.HELD_BY_PARENT
+        return locks.OK
+
+    def check_free(self, resource, now):
+        index, lock_data = self.find_nearest(resource, now)
+        if lock_data is not None:
+            return locks.HELD if index == 0 else locks.HELD_BY_PARENT, lock_data
+
+        child = self.get_child_lock(resource, now)
+        if child is not None:
+            return locks.HELD_BY_CHILD, {"id": child}
+        return None
+
+    def acquire_locks(self, items, atomic=False):
+        now = locks.now_milliseconds()
+        with self.lock_trees([resource for resource, _, _ in items]):
+            results, acquired = [], []
+            for resource, _, lock_data in items:
+                result = self.check_free(resource, now)
+                if result is None:
+                    self.set_lock(resource, lock_data)
+                    acquired.append(resource.id)
+                    result = locks.OK, lock_data
+                elif atomic:
+                    # Undo the batch, no other client could have seen it
+                    self.delete_locks(acquired)
+                    aborted = [(locks.ABORTED, None)] * len(items)
+                    aborted[len(results)] = result
+                    return aborted
+                results.append(result)
+            return results
+
+    def check_releases(self, items, user_id, now):
+        results, releases = [], []
+        for resource, lock_code in items:
+            index, lock_data = self.find_nearest(resource, now)
+            if lock_data is None:
+                # Nothing to release
+                results.append(locks.OK)
+                continue
+
+            result = self.check_holder(index, lock_data, user_id, lock_code)
+            if result == locks.OK:
+                releases.append(resource.id)
+            results.append(result)
+        return results, releases
+
+    def check_locks(self, items, user_id):
+        now = locks.now_milliseconds()
+        with self.lock_trees([resource for resource, _ in items]):
+            return self.check_releases(items, user_id, now)[0]
+
+    def release_locks(self, items, user_id, atomic=False):
+        now = locks.now_milliseconds()
+        with self.lock_trees([resource for resource, _ in items]):
+            results, releases = self.check_releases(items, user_id, now)
+            if atomic and any(result != locks.OK for result in results):
+                return [
+                    locks.ABORTED if result == locks.OK else result
+                    for result in results
+                ]
+
+            self.delete_locks(releases)
+            return results
+
+    def renew_lock(self, resource, user_id, lock_code, timeout):
+        now = locks.now_milliseconds()
+        with self.lock_trees([resource]):
+            index, lock_data = self.find_nearest(resource, now)
+            if lock_data is None:
+                return locks.NOT_LOCKED, None
+
+            result = self.check_holder(index, lock_data, user_id, lock_code)
+            if result != locks.OK:
+                return result, None
+
+            lock_data = {**lock_data, "expires_at": locks.to_iso(now + timeout * 1000)}
+            self.set_lock(resource, lock_data)
+            return locks.OK, lock_data
+
+    def find_locks(self, resources):
+        now = locks.now_milliseconds()
+        current = self.get_locks(
+            {resource_id for resource in resources for resource_id in resource.lineage},
+            now,
+        )
+        return {
+            resource.id: next(
+                (
+                    current[resource_id]
+                    for resource_id in resource.lineage
+                    if resource_id in current
+                ),
+                None,
+            )
+            for resource in resources
+        }
+
+    def has_locked_children(self, resource):
+        return self.get_child_lock(resource, locks.now_milliseconds()) is not None
@@ -0,0 +1,98 @@
+from .. import locks
+from ..models import Resource, ResourceLock
+from .base import TreeLockBackend
+from contextlib import contextmanager
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+
+# First key of the PostgreSQL advisory locks taken on resource trees
+ADVISORY_LOCK_NAMESPACE = 0x5245534F
+
+
+class DatabaseLockBackend(TreeLockBackend):
+    # Locks stored in the ResourceLock table, for deployments without a Redis
+    # lock engine. Changes within a tree are serialized by a transaction level
+    # advisory lock on its root on PostgreSQL, by locking the root row on the
+    # other databases with SELECT ... FOR UPDATE, and on SQLite by immediate
+    # transactions, which take the database write lock when they begin
+
+    def __init__(self):
+        if connection.vendor == "sqlite":
+            mode = connection.settings_dict["OPTIONS"].get("transaction_mode")
+            if mode != "IMMEDIATE":
+                raise ImproperlyConfigured(
+                    "DatabaseLockBackend needs the SQLite transaction_mode "
+                    "option set to IMMEDIATE."
+                )
+        elif (
+            connection.vendor != "postgresql"
+            and not connection.features.has_select_for_update
+        ):
+            raise ImproperlyConfigured(
+                f"DatabaseLockBackend cannot lock rows on {connection.vendor}."
+            )
+
+    @contextmanager
+    def lock_trees(self, resources):
+        # Sorted so that concurrent batches cannot deadlock
+        roots = sorted({resource.lineage[-1] for resource in resources})
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    for root in roots:
+                        cursor.execute(
+                            "SELECT pg_advisory_xact_lock(%s, %s)",
+                            [ADVISORY_LOCK_NAMESPACE, root % 2**31],
+                        )
+            elif connection.vendor != "sqlite":
+                list(
+                    Resource.objects.select_for_update()
+                    .filter(pk__in=roots)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)
+                )
+            yield
+
+    def get_locks(self, ids, now):
+        return {
+            row.resource_id: to_lock(row)
+            for row in ResourceLock.objects.filter(
+                resource_id__in=ids, expires_at__gt=now
+            )
+        }
+
+    def get_child_lock(self, resource, now):
+        # Joined with the resources so moved subtrees are always current
+        return (
+            ResourceLock.objects.filter(
+                resource__path__startswith=resource.path, expires_at__gt=now
+            )
+            .exclude(resource_id=resource.id)
+            .values_list("resource_id", flat=True)
+            .first()
+        )
+
+    def set_lock(self, resource, lock_data):
+        ResourceLock.objects.update_or_create(
+            resource_id=resource.id,
+            defaults={
+                "user_id": lock_data["user_id"],
+                "lock_code": lock_data["lock_code"],
+                "timestamp": locks.to_milliseconds(lock_data["timestamp"]),
+                "expires_at": locks.to_milliseconds(lock_data["expires_at"]),
+            },
+        )
+
+    def delete_locks(self, ids):
+        if ids:
+            ResourceLock.objects.filter(resource_id__in=ids).delete()
+
+
+def to_lock(row):
+    return {
+        "user_id": row.user_id,
+        "timestamp": locks.to_iso(row.timestamp),
+        "expires_at": locks.to_iso(row.expires_at),
+        "lock_code": str(row.lock_code),
+        "id": row.resource_id,
+    }
@@ -0,0 +1,59 @@
+from .. import locks
+from .base import TreeLockBackend
+from collections import defaultdict
+import threading
+
+
+class MemoryLockBackend(TreeLockBackend):
+    # Locks kept in this process only, for tests and single process
+    # deployments. A single mutex serializes every lock change
+
+    def __init__(self):
+        self.mutex = threading.RLock()
+        # Resource id -> (lock record, expiry in epoch milliseconds, path)
+        self.entries = {}
+        # Resource id -> ids of its locked descendants
+        self.subtrees = defaultdict(set)
+
+    def lock_trees(self, resources):
+        return self.mutex
+
+    def get_locks(self, ids, now):
+        found = {}
+        with self.mutex:
+            for resource_id in ids:
+                entry = self.entries.get(resource_id)
+                if entry is None:
+                    continue
+                if entry[1] > now:
+                    found[resource_id] = entry[0]
+                else:
+                    del self.entries[resource_id]
+        return found
+
+    def get_child_lock(self, resource, now):
+        with self.mutex:
+            for resource_id in list(self.subtrees.get(resource.id, ())):
+                entry = self.entries.get(resource_id)
+                if entry is None or not entry[2].startswith(resource.path):
+                    self.subtrees[resource.id].discard(resource_id)
+                elif entry[1] > now:
+                    return resource_id
+        return None
+
+    def set_lock(self, resource, lock_data):
+        with self.mutex:
+            expires_at = locks.to_milliseconds(lock_data["expires_at"])
+            self.entries[resource.id] = (lock_data, expires_at, resource.path)
+            for resource_id in resource.lineage[1:]:
+                self.subtrees[resource_id].add(resource.id)
+
+    def delete_locks(self, ids):
+        with self.mutex:
+            for resource_id in ids:
+                self.entries.pop(resource_id, None)
+
+    def clear(self):
+        with self.mutex:
+            self.entries.clear()
+            self.subtrees.clear()
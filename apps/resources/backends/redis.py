@@ -0,0 +1,811 @@
+from .. import lock_cache, locks, metrics, subscriptions
+from .base import LockBackend
+from django.conf import settings
+from django_redis import get_redis_connection
+import asyncio, functools, redis.asyncio, redis.cluster, struct, time, uuid
+
+# Longest time a waiter sleeps before checking the lock again, waiters are
+# only woken up early when the resource itself is released
+WAIT_POLL_INTERVAL = 1
+
+# Release script mode that only checks owner and code of the locks, used to
+# check every tree of an atomic batch before any of them is released
+CHECK_ONLY = 2
+
+# Pub/sub channel of the lock events, expired locks are reported by Redis
+# keyspace notifications instead
+EVENTS_CHANNEL = "resource_lock_events"
+
+# Lock records are packed as user id, resource id, creation and expiry times
+# in epoch milliseconds and the 16 bytes of the lock code UUID, 48 bytes in
+# total. Both formats describe the same big endian layout
+LOCK_FORMAT = ">QQQQ16s"
+LUA_LOCK_FORMAT = ">I8I8I8I8c16"
+
+# Event loop -> (client, task closing it on shutdown)
+async_clients = {}
+
+LOCK_FUNCTIONS = f"""
+local function decode(holder)
+    local user_id, id, timestamp, expires_at, lock_code = struct.unpack(
+        "{LUA_LOCK_FORMAT}", holder
+    )
+    return {{
+        user_id = user_id,
+        id = id,
+        timestamp = timestamp,
+        expires_at = expires_at,
+        lock_code = lock_code,
+    }}
+end
+
+local function encode(lock)
+    return struct.pack(
+        "{LUA_LOCK_FORMAT}",
+        lock.user_id,
+        lock.id,
+        lock.timestamp,
+        lock.expires_at,
+        lock.lock_code
+    )
+end
+
+-- Time of the Redis server in epoch milliseconds, keys expire on its clock
+local function now_milliseconds()
+    local time = redis.call("TIME")
+    return tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+end
+
+local function publish(event, resource_id, path, holder)
+    local lock = decode(holder)
+    redis.call("PUBLISH", "{EVENTS_CHANNEL}", cjson.encode({{
+        event = event,
+        id = tonumber(resource_id),
+        path = path,
+        user_id = lock.user_id,
+        expires_at = lock.expires_at,
+    }}))
+end
+"""
+
+# KEYS: for each resource, the lock keys of the resource and its ancestors,
+# nearest first, followed by their subtree lock index keys in the same order,
+# the waiting queue key and the wake up signal key of the resource
+# ARGV: atomic flag, then for each resource its id, its depth, the timeout in
+# seconds, the new lock record, the waiting ticket and its materialized path.
+# The times of the lock record are set from the Redis clock
+ACQUIRE_SCRIPT = (
+    LOCK_FUNCTIONS
+    + """
+local now_ms = now_milliseconds()
+local now = now_ms / 1000
+local atomic = ARGV[1] == "1"
+
+local function check(offset, depth)
+    for index = offset + 1, offset + depth do
+        local holder = redis.call("GET", KEYS[index])
+        if holder then
+            return {index == offset + 1 and 4 or 3, holder}
+        end
+    end
+
+    local children = redis.call(
+        "ZRANGEBYSCORE", KEYS[offset + depth + 1], now, "+inf", "LIMIT", 0, 1
+    )
+    if #children > 0 then
+        return {5, children[1]}
+    end
+end
+
+local function acquire(offset, depth, resource_id, timeout, lock, ticket)
+    local queue = KEYS[offset + depth * 2 + 1]
+
+    -- Tickets start with the time their waiter gives up
+    local head = redis.call("ZRANGE", queue, 0, 0)[1]
+    while head and tonumber(string.match(head, "^[^:]+")) < now do
+        redis.call("ZREM", queue, head)
+        head = redis.call("ZRANGE", queue, 0, 0)[1]
+    end
+
+    local result = check(offset, depth)
+    if not result and head and head ~= ticket then
+        result = {8, head}
+    end
+
+    if result then
+        local deadline = tonumber(string.match(ticket, "^[^:]+"))
+        if deadline and deadline > now then
+            redis.call("ZADD", queue, "NX", now, ticket)
+            if redis.call("TTL", queue) < deadline - now then
+                redis.call("EXPIRE", queue, math.ceil(deadline - now))
+            end
+        end
+        return result
+    end
+
+    local record = decode(lock)
+    record.timestamp = now_ms
+    record.expires_at = now_ms + timeout * 1000
+    lock = encode(record)
+
+    redis.call("SET", KEYS[offset + 1], lock, "PXAT", record.expires_at)
+    if ticket ~= "" then
+        redis.call("ZREM", queue, ticket)
+    end
+
+    -- Index the lock on every ancestor, scored by its expiry time
+    for index = offset + depth + 2, offset + depth * 2 do
+        redis.call("ZREMRANGEBYSCORE", KEYS[index], "-inf", "(" .. now)
+        redis.call("ZADD", KEYS[index], record.expires_at / 1000, resource_id)
+        if redis.call("TTL", KEYS[index]) < timeout then
+            redis.call("EXPIRE", KEYS[index], timeout)
+        end
+    end
+
+    return {0, lock}
+end
+
+local function release(offset, depth, resource_id)
+    redis.call("DEL", KEYS[offset + 1])
+    for index = offset + depth + 2, offset + depth * 2 do
+        redis.call("ZREM", KEYS[index], resource_id)
+    end
+end
+
+local results = {}
+local acquired = {}
+local offset = 0
+
+for item = 2, #ARGV, 6 do
+    local resource_id, depth = ARGV[item], tonumber(ARGV[item + 1])
+    local result = acquire(
+        offset, depth, resource_id, tonumber(ARGV[item + 2]), ARGV[item + 3], ARGV[item + 4]
+    )
+
+    if result[1] == 0 then
+        table.insert(acquired, {offset, depth, resource_id, result[2], ARGV[item + 5]})
+    elseif atomic then
+        -- Undo the batch, no other client could have seen it
+        for _, lock in ipairs(acquired) do
+            release(unpack(lock))
+        end
+
+        local aborted = {}
+        for index = 1, (#ARGV - 1) / 6 do
+            aborted[index] = {6, ""}
+        end
+        aborted[#results + 1] = result
+        return aborted
+    end
+
+    table.insert(results, result)
+    offset = offset + depth * 2 + 2
+end
+
+for _, lock in ipairs(acquired) do
+    local _, _, resource_id, holder, path = unpack(lock)
+    publish("acquired", resource_id, path, holder)
+end
+
+return results
+"""
+)
+
+# KEYS: same as the acquire script
+# ARGV: user id, mode (1 when atomic, 2 to only check the locks), then for
+# each resource its id, its depth, the lock code and its materialized path
+RELEASE_SCRIPT = (
+    LOCK_FUNCTIONS
+    + """
+local user_id = tonumber(ARGV[1])
+local atomic = ARGV[2] ~= "0"
+
+local function check(offset, depth, lock_code)
+    for index = offset + 1, offset + depth do
+        local holder = redis.call("GET", KEYS[index])
+        if holder then
+            local lock = decode(holder)
+            if lock.user_id ~= user_id then
+                return 1
+            elseif lock.lock_code ~= lock_code then
+                return 2
+            elseif index > offset + 1 then
+                return 3
+            end
+            return 0, holder
+        end
+    end
+
+    -- Nothing to release
+    return 0
+end
+
+local results = {}
+local releases = {}
+local failed = false
+local offset = 0
+
+for item = 3, #ARGV, 4 do
+    local resource_id, depth = ARGV[item], tonumber(ARGV[item + 1])
+    local result, holder = check(offset, depth, ARGV[item + 2])
+
+    if result ~= 0 then
+        failed = true
+    elseif holder then
+        table.insert(releases, {offset, depth, resource_id, holder, ARGV[item + 3]})
+    end
+
+    table.insert(results, result)
+    offset = offset + depth * 2 + 2
+end
+
+if ARGV[2] == "2" then
+    -- Checked only, nothing is released
+    return results
+end
+
+if atomic and failed then
+    for index, result in ipairs(results) do
+        if result == 0 then
+            results[index] = 6
+        end
+    end
+    return results
+end
+
+for _, lock in ipairs(releases) do
+    local offset, depth, resource_id, holder, path = unpack(lock)
+    redis.call("DEL", KEYS[offset + 1])
+    for index = offset + depth + 2, offset + depth * 2 do
+        redis.call("ZREM", KEYS[index], resource_id)
+    end
+    publish("released", resource_id, path, holder)
+
+    -- Wake up every waiter still waiting, the one at the head of the queue
+    -- takes the lock. Tickets start with the time their waiter gives up
+    local waiting = 0
+    local now = now_milliseconds() / 1000
+    local queue = KEYS[offset + depth * 2 + 1]
+    for _, ticket in ipairs(redis.call("ZRANGE", queue, 0, 99)) do
+        if tonumber(string.match(ticket, "^[^:]+")) >= now then
+            waiting = waiting + 1
+        end
+    end
+    if waiting > 0 then
+        local signal = KEYS[offset + depth * 2 + 2]
+        redis.call("DEL", signal)
+        for _ = 1, waiting do
+            redis.call("RPUSH", signal, 1)
+        end
+        redis.call("EXPIRE", signal, 5)
+    end
+end
+
+return results
+"""
+)
+
+# KEYS: lock keys of a single resource and its ancestors, nearest first,
+# followed by their subtree lock index keys in the same order
+# ARGV: user id, lock code, resource id, timeout in seconds, materialized path
+RENEW_SCRIPT = (
+    LOCK_FUNCTIONS
+    + """
+local depth = #KEYS / 2
+local timeout = tonumber(ARGV[4])
+local expires_at = now_milliseconds() + timeout * 1000
+
+for index = 1, depth do
+    local holder = redis.call("GET", KEYS[index])
+    if holder then
+        local lock = decode(holder)
+        if lock.user_id ~= tonumber(ARGV[1]) then
+            return {1, ""}
+        elseif lock.lock_code ~= ARGV[2] then
+            return {2, ""}
+        elseif index > 1 then
+            return {3, ""}
+        end
+
+        -- The key and its index entries expire at the same millisecond
+        lock.expires_at = expires_at
+        holder = encode(lock)
+        redis.call("SET", KEYS[1], holder, "PXAT", expires_at)
+
+        for ancestor = depth + 2, #KEYS do
+            redis.call("ZADD", KEYS[ancestor], expires_at / 1000, ARGV[3])
+            if redis.call("TTL", KEYS[ancestor]) < timeout then
+                redis.call("EXPIRE", KEYS[ancestor], timeout)
+            end
+        end
+        publish("renewed", ARGV[3], ARGV[5], holder)
+        return {0, holder}
+    end
+end
+
+return {7, ""}
+"""
+)
+
+# KEYS: subtree lock index key of a resource
+HAS_LOCKED_CHILDREN_SCRIPT = (
+    LOCK_FUNCTIONS
+    + """
+return redis.call("ZCOUNT", KEYS[1], now_milliseconds() / 1000, "+inf")
+"""
+)
+
+
+def get_client():
+    # Raw client, lock records are packed binary strings the Lua scripts read
+    if settings.RESOURCE_LOCK_REDIS_CLUSTER:
+        return get_cluster_client()
+    return get_redis_connection("default")
+
+
+@functools.cache
+def get_cluster_client():
+    config = settings.CACHES["default"]
+    return redis.cluster.RedisCluster.from_url(
+        subscriptions.get_url(),
+        socket_connect_timeout=config["OPTIONS"].get("SOCKET_CONNECT_TIMEOUT"),
+        socket_timeout=config["OPTIONS"].get("SOCKET_TIMEOUT"),
+    )
+
+
+@functools.cache
+def get_script(source):
+    return get_client().register_script(source)
+
+
+def get_async_client():
+    # asyncio connections are bound to their event loop, so each loop gets
+    # its own connection pool shared by all of its requests
+    loop = asyncio.get_running_loop()
+    if loop not in async_clients:
+        config = settings.CACHES["default"]
+        client_class = (
+            redis.asyncio.RedisCluster
+            if settings.RESOURCE_LOCK_REDIS_CLUSTER
+            else redis.asyncio.Redis
+        )
+        client = client_class.from_url(
+            subscriptions.get_url(),
+            socket_connect_timeout=config["OPTIONS"].get("SOCKET_CONNECT_TIMEOUT"),
+            socket_timeout=config["OPTIONS"].get("SOCKET_TIMEOUT"),
+        )
+        # The task is kept with the client, the loop only holds weak
+        # references to its tasks. Both are dropped once the loop shuts down,
+        # until then the task keeps the loop alive
+        task = loop.create_task(close_on_shutdown(client))
+        task.add_done_callback(lambda task: async_clients.pop(loop, None))
+        async_clients[loop] = (client, task)
+    return async_clients[loop][0]
+
+
+async def close_on_shutdown(client):
+    # asyncio.run and async_to_sync cancel the pending tasks of a loop before
+    # closing it, so the connections are closed while the loop still runs
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await client.aclose()
+
+
+def get_async_script(source):
+    return get_async_client().register_script(source)
+
+
+def mget(client, keys):
+    # Keys of different trees live in different slots on Redis Cluster
+    if settings.RESOURCE_LOCK_REDIS_CLUSTER:
+        return client.mget_nonatomic(keys)
+    return client.mget(keys)
+
+
+# Every key of a tree carries the id of its root as hash tag, so that the
+# scripts checking a resource, its ancestors and its descendants only touch
+# keys of a single Redis Cluster slot
+
+
+def lock_key(resource_id, root_id):
+    return f"resource_lock_{{{root_id}}}_{resource_id}"
+
+
+def subtree_key(resource_id, root_id):
+    # Sorted set of the locked descendants of a resource
+    return f"resource_subtree_locks_{{{root_id}}}_{resource_id}"
+
+
+def queue_key(resource_id, root_id):
+    # Sorted set of the tickets of the clients waiting for a resource
+    return f"resource_lock_queue_{{{root_id}}}_{resource_id}"
+
+
+def signal_key(resource_id, root_id):
+    return f"resource_lock_signal_{{{root_id}}}_{resource_id}"
+
+
+def get_root(path):
+    return int(path.split("/", 1)[0])
+
+
+def resource_lock_key(resource):
+    return lock_key(resource.id, resource.lineage[-1])
+
+
+def get_lineage_keys(lineage):
+    return [lock_key(resource_id, lineage[-1]) for resource_id in lineage] + [
+        subtree_key(resource_id, lineage[-1]) for resource_id in lineage
+    ]
+
+
+def get_keys(lineage):
+    return get_lineage_keys(lineage) + [
+        queue_key(lineage[0], lineage[-1]),
+        signal_key(lineage[0], lineage[-1]),
+    ]
+
+
+# Most resources of a script call, a script blocks Redis until it is done
+SCRIPT_BATCH_SIZE = 500
+
+
+def split_batch(resources):
+    # Indexes of the resources of each script call. Scripts may only touch
+    # keys of a single slot on Redis Cluster, so batches are split by tree
+    # there
+    if not settings.RESOURCE_LOCK_REDIS_CLUSTER:
+        trees = [list(range(len(resources)))]
+    else:
+        trees = {}
+        for index, resource in enumerate(resources):
+            trees.setdefault(resource.lineage[-1], []).append(index)
+        trees = list(trees.values())
+
+    return [
+        tree[start : start + SCRIPT_BATCH_SIZE]
+        for tree in trees
+        for start in range(0, len(tree), SCRIPT_BATCH_SIZE)
+    ]
+
+
+def encode_lock(lock_data):
+    return struct.pack(
+        LOCK_FORMAT,
+        lock_data["user_id"],
+        lock_data["id"],
+        locks.to_milliseconds(lock_data["timestamp"]),
+        locks.to_milliseconds(lock_data["expires_at"]),
+        uuid.UUID(lock_data["lock_code"]).bytes,
+    )
+
+
+def decode_lock(holder):
+    user_id, resource_id, timestamp, expires_at, lock_code = struct.unpack(
+        LOCK_FORMAT, holder
+    )
+    return {
+        "user_id": user_id,
+        "timestamp": locks.to_iso(timestamp),
+        "expires_at": locks.to_iso(expires_at),
+        "lock_code": str(uuid.UUID(bytes=lock_code)),
+        "id": resource_id,
+    }
+
+
+def lock_expiry(holder):
+    # Expiry time in epoch seconds, without decoding the whole record
+    return struct.unpack(LOCK_FORMAT, holder)[3] / 1000
+
+
+def find_lock_keys(resource):
+    lineage = resource.lineage
+    return [lock_key(resource_id, lineage[-1]) for resource_id in lineage]
+
+
+def find_lock_result(values):
+    for lock_data in values:
+        if lock_data:
+            return decode_lock(lock_data)
+    return None
+
+
+def find_locks_keys(resources):
+    return list(
+        dict.fromkeys(key for resource in resources for key in find_lock_keys(resource))
+    )
+
+
+def find_locks_result(resources, values):
+    return {
+        resource.id: find_lock_result(values[key] for key in find_lock_keys(resource))
+        for resource in resources
+    }
+
+
+def read_locks(keys):
+    # Status reads are served by the near cache, whatever it misses is read
+    # with a single MGET
+    values, missing, since = lock_cache.get_many(keys)
+    if missing:
+        with metrics.round_trip("mget"):
+            values.update(zip(missing, mget(get_client(), missing)))
+        lock_cache.add_many({key: values[key] for key in missing}, since)
+    return [values[key] for key in keys]
+
+
+async def aread_locks(keys):
+    values, missing, since = lock_cache.get_many(keys)
+    if missing:
+        with metrics.round_trip("mget"):
+            values.update(zip(missing, await mget(get_async_client(), missing)))
+        lock_cache.add_many({key: values[key] for key in missing}, since)
+    return [values[key] for key in keys]
+
+
+def acquire_locks_request(items, atomic, ticket):
+    keys, args = [], [int(atomic)]
+    for resource, timeout, lock_data in items:
+        lineage = resource.lineage
+        keys += get_keys(lineage)
+        args += [
+            resource.id,
+            len(lineage),
+            timeout,
+            encode_lock(lock_data),
+            ticket,
+            resource.path,
+        ]
+    return {"keys": keys, "args": args}
+
+
+def acquire_locks_result(results):
+    for result, holder in results:
+        if result == locks.ABORTED:
+            yield result, None
+        elif result == locks.QUEUED:
+            yield result, {"ticket": holder.decode()}
+        elif result == locks.HELD_BY_CHILD:
+            yield result, {"id": int(holder)}
+        else:
+            yield result, decode_lock(holder)
+
+
+def has_failed(results):
+    return any(result is not None and result[0] != locks.OK for result in results)
+
+
+def get_acquired(items, results):
+    # Locks taken on the trees already done when an atomic batch fails
+    return [
+        (resource, result[1]["lock_code"])
+        for (resource, _, _), result in zip(items, results)
+        if result is not None and result[0] == locks.OK
+    ]
+
+
+def get_aborted(results):
+    return [
+        (locks.ABORTED, None) if result is None or result[0] == locks.OK else result
+        for result in results
+    ]
+
+
+def get_aborted_releases(results):
+    return [locks.ABORTED if result == locks.OK else result for result in results]
+
+
+def changed(resources):
+    # This process sees its own lock changes right away, the others once the
+    # lock events reach them
+    lock_cache.invalidate([resource_lock_key(resource) for resource in resources])
+
+
+def renew_lock_request(resource, user_id, lock_code, timeout):
+    return {
+        "keys": get_lineage_keys(resource.lineage),
+        "args": [
+            user_id,
+            locks.lock_code_bytes(lock_code),
+            resource.id,
+            timeout,
+            resource.path,
+        ],
+    }
+
+
+def renew_lock_result(result, holder):
+    return result, decode_lock(holder) if result == locks.OK else None
+
+
+def release_locks_request(items, user_id, mode):
+    keys, args = [], [user_id, mode]
+    for resource, lock_code in items:
+        lineage = resource.lineage
+        keys += get_keys(lineage)
+        args += [
+            resource.id,
+            len(lineage),
+            locks.lock_code_bytes(lock_code),
+            resource.path,
+        ]
+    return {"keys": keys, "args": args}
+
+
+class RedisLockBackend(LockBackend):
+    # Locking rules run in Lua scripts, every operation is a single atomic
+    # round trip. Lock changes are published as lock events and status reads
+    # go through the near cache
+
+    def acquire_locks(self, items, atomic=False, ticket=""):
+        # Checks the ancestors and descendants of every item and sets the
+        # locks in a single atomic step per script call
+        results = [None] * len(items)
+        for batch in split_batch([resource for resource, _, _ in items]):
+            batch_items = [items[index] for index in batch]
+            request = acquire_locks_request(batch_items, atomic, ticket)
+            with metrics.round_trip("acquire"):
+                batch_results = get_script(ACQUIRE_SCRIPT)(**request)
+            changed(resource for resource, _, _ in batch_items)
+            for index, result in zip(batch, acquire_locks_result(batch_results)):
+                results[index] = result
+
+            if atomic and has_failed(results):
+                acquired = get_acquired(items, results)
+                if acquired:
+                    self.release_locks(acquired, items[0][2]["user_id"])
+                return get_aborted(results)
+        return results
+
+    async def aacquire_locks(self, items, atomic=False, ticket=""):
+        results = [None] * len(items)
+        for batch in split_batch([resource for resource, _, _ in items]):
+            batch_items = [items[index] for index in batch]
+            request = acquire_locks_request(batch_items, atomic, ticket)
+            with metrics.round_trip("acquire"):
+                batch_results = await get_async_script(ACQUIRE_SCRIPT)(**request)
+            changed(resource for resource, _, _ in batch_items)
+            for index, result in zip(batch, acquire_locks_result(batch_results)):
+                results[index] = result
+
+            if atomic and has_failed(results):
+                acquired = get_acquired(items, results)
+                if acquired:
+                    await self.arelease_locks(acquired, items[0][2]["user_id"])
+                return get_aborted(results)
+        return results
+
+    def release_locks(self, items, user_id, atomic=False):
+        # Compares owner and code of every item and deletes the locks in a
+        # single atomic step per script call
+        batches = split_batch([resource for resource, _ in items])
+        if atomic and len(batches) > 1:
+            results = self.release_batches(items, batches, user_id, CHECK_ONLY)
+            if any(result != locks.OK for result in results):
+                return get_aborted_releases(results)
+        return self.release_batches(items, batches, user_id, int(atomic))
+
+    async def arelease_locks(self, items, user_id, atomic=False):
+        batches = split_batch([resource for resource, _ in items])
+        if atomic and len(batches) > 1:
+            results = await self.arelease_batches(items, batches, user_id, CHECK_ONLY)
+            if any(result != locks.OK for result in results):
+                return get_aborted_releases(results)
+        return await self.arelease_batches(items, batches, user_id, int(atomic))
+
+    def check_locks(self, items, user_id):
+        batches = split_batch([resource for resource, _ in items])
+        return self.release_batches(items, batches, user_id, CHECK_ONLY)
+
+    def release_batches(self, items, batches, user_id, mode):
+        results = [None] * len(items)
+        for batch in batches:
+            batch_items = [items[index] for index in batch]
+            request = release_locks_request(batch_items, user_id, mode)
+            with metrics.round_trip("release"):
+                batch_results = get_script(RELEASE_SCRIPT)(**request)
+            for index, result in zip(batch, batch_results):
+                results[index] = result
+        if mode != CHECK_ONLY:
+            changed(resource for resource, _ in items)
+        return results
+
+    async def arelease_batches(self, items, batches, user_id, mode):
+        results = [None] * len(items)
+        for batch in batches:
+            batch_items = [items[index] for index in batch]
+            request = release_locks_request(batch_items, user_id, mode)
+            with metrics.round_trip("release"):
+                batch_results = await get_async_script(RELEASE_SCRIPT)(**request)
+            for index, result in zip(batch, batch_results):
+                results[index] = result
+        if mode != CHECK_ONLY:
+            changed(resource for resource, _ in items)
+        return results
+
+    def renew_lock(self, resource, user_id, lock_code, timeout):
+        # Compares owner and code and extends the lock in a single atomic step
+        request = renew_lock_request(resource, user_id, lock_code, timeout)
+        with metrics.round_trip("renew"):
+            result = get_script(RENEW_SCRIPT)(**request)
+        changed([resource])
+        return renew_lock_result(*result)
+
+    async def arenew_lock(self, resource, user_id, lock_code, timeout):
+        request = renew_lock_request(resource, user_id, lock_code, timeout)
+        with metrics.round_trip("renew"):
+            result = await get_async_script(RENEW_SCRIPT)(**request)
+        changed([resource])
+        return renew_lock_result(*result)
+
+    def find_locks(self, resources):
+        # Locks of every resource and all of their ancestors in a single read
+        keys = find_locks_keys(resources)
+        return find_locks_result(resources, dict(zip(keys, read_locks(keys))))
+
+    async def afind_locks(self, resources):
+        keys = find_locks_keys(resources)
+        return find_locks_result(resources, dict(zip(keys, await aread_locks(keys))))
+
+    def has_locked_children(self, resource):
+        # Live index entries are told apart on the Redis clock
+        with metrics.round_trip("zcount"):
+            return (
+                get_script(HAS_LOCKED_CHILDREN_SCRIPT)(
+                    keys=[subtree_key(resource.id, resource.lineage[-1])]
+                )
+                > 0
+            )
+
+    def wait_for_lock(self, resource, user_id, timeout, wait):
+        # Queues the caller behind earlier waiters until the lock is granted
+        # or the wait time is over
+        deadline = time.time() + min(wait, settings.RESOURCE_LOCKS["MAX_WAIT"])
+        ticket = f"{deadline:.3f}:{uuid.uuid4().hex}"
+        lock_code = str(uuid.uuid4())
+        client = get_client()
+
+        while True:
+            lock_data = locks.new_lock(user_id, resource.id, timeout, lock_code)
+            [(result, holder)] = self.acquire_locks(
+                [(resource, timeout, lock_data)], ticket=ticket
+            )
+            remaining = deadline - time.time()
+            if result == locks.OK or remaining <= 0:
+                break
+            with metrics.round_trip("blpop"):
+                client.blpop(
+                    signal_key(resource.id, resource.lineage[-1]),
+                    timeout=min(remaining, WAIT_POLL_INTERVAL),
+                )
+
+        if result != locks.OK:
+            with metrics.round_trip("zrem"):
+                client.zrem(queue_key(resource.id, resource.lineage[-1]), ticket)
+        return result, holder
+
+    async def await_for_lock(self, resource, user_id, timeout, wait):
+        deadline = time.time() + min(wait, settings.RESOURCE_LOCKS["MAX_WAIT"])
+        ticket = f"{deadline:.3f}:{uuid.uuid4().hex}"
+        lock_code = str(uuid.uuid4())
+        client = get_async_client()
+
+        while True:
+            lock_data = locks.new_lock(user_id, resource.id, timeout, lock_code)
+            [(result, holder)] = await self.aacquire_locks(
+                [(resource, timeout, lock_data)], ticket=ticket
+            )
+            remaining = deadline - time.time()
+            if result == locks.OK or remaining <= 0:
+                break
+            with metrics.round_trip("blpop"):
+                await client.blpop(
+                    signal_key(resource.id, resource.lineage[-1]),
+                    timeout=min(remaining, WAIT_POLL_INTERVAL),
+                )
+
+        if result != locks.OK:
+            with metrics.round_trip("zrem"):
+                await client.zrem(queue_key(resource.id, resource.lineage[-1]), ticket)
+        return result, holder
@@ -0,0 +1,193 @@
+from . import backends, locks, metrics
+from django.conf import settings
+import json, logging, zlib
+
+logger = logging.getLogger(__name__)
+
+# Imported by locks while the lock engines load, so backends.redis is only
+# looked up when called
+
+# Every contention key shares a hash tag, so the script runs on a single
+# Redis Cluster slot
+RESOURCES_SKETCH_KEY = "resource_contention_{tracker}_resources_sketch"
+RESOURCES_TOP_KEY = "resource_contention_{tracker}_resources_top"
+DWELL_KEY = "resource_contention_{tracker}_dwell"
+SUBTREES_SKETCH_KEY = "resource_contention_{tracker}_subtrees_sketch"
+SUBTREES_TOP_KEY = "resource_contention_{tracker}_subtrees_top"
+
+# Conflicts are counted in count-min sketches, hashes of DEPTH rows of WIDTH
+# counters, and the SIZE most contended members are kept in sorted sets
+# scored by their estimate. Members pushed out of a full sorted set lose
+# their dwell totals
+# KEYS: resource sketch, resource top, dwell hash, subtree sketch, subtree top
+# ARGV: top size, window in seconds, then the JSON list of the conflicts,
+# each with the resource id, the age of the blocking lock in milliseconds or
+# -1 when unknown, the sketch columns of the resource and the id and sketch
+# columns of the resource and each of its ancestors
+RECORD_SCRIPT = """
+local size = tonumber(ARGV[1])
+
+local function add(sketch, top, member, columns)
+    local estimate
+    for row, column in ipairs(columns) do
+        local count = redis.call("HINCRBY", sketch, row .. ":" .. column, 1)
+        if not estimate or count < estimate then
+            estimate = count
+        end
+    end
+
+    if redis.call("ZSCORE", top, member) or redis.call("ZCARD", top) < size then
+        redis.call("ZADD", top, estimate, member)
+        return true
+    end
+    local lowest = redis.call("ZRANGE", top, 0, 0, "WITHSCORES")
+    if estimate <= tonumber(lowest[2]) then
+        return false
+    end
+    redis.call("ZREM", top, lowest[1])
+    redis.call("HDEL", KEYS[3], lowest[1] .. ":ms", lowest[1] .. ":n")
+    redis.call("ZADD", top, estimate, member)
+    return true
+end
+
+for _, conflict in ipairs(cjson.decode(ARGV[3])) do
+    local member = tostring(conflict.id)
+    if add(KEYS[1], KEYS[2], member, conflict.columns) and conflict.dwell >= 0 then
+        redis.call("HINCRBY", KEYS[3], member .. ":ms", conflict.dwell)
+        redis.call("HINCRBY", KEYS[3], member .. ":n", 1)
+    end
+    for _, subtree in ipairs(conflict.subtrees) do
+        add(KEYS[4], KEYS[5], tostring(subtree.id), subtree.columns)
+    end
+end
+
+-- Counts start over every window
+for _, key in ipairs(KEYS) do
+    if redis.call("TTL", key) == -1 then
+        redis.call("EXPIRE", key, ARGV[2])
+    end
+end
+"""
+
+
+def get_keys():
+    return [
+        RESOURCES_SKETCH_KEY,
+        RESOURCES_TOP_KEY,
+        DWELL_KEY,
+        SUBTREES_SKETCH_KEY,
+        SUBTREES_TOP_KEY,
+    ]
+
+
+def get_columns(resource_id):
+    config = settings.RESOURCE_LOCK_CONTENTION
+    return [
+        zlib.crc32(f"{row}:{resource_id}".encode()) % config["WIDTH"]
+        for row in range(config["DEPTH"])
+    ]
+
+
+def get_conflicts(items, results):
+    now = locks.now_milliseconds()
+    conflicts = []
+    for (resource, _, _), (result, holder) in zip(items, results):
+        if result not in locks.CONFLICTS:
+            continue
+        # Descendant holders are only reported by id
+        dwell = -1
+        if holder and "timestamp" in holder:
+            dwell = max(0, now - locks.to_milliseconds(holder["timestamp"]))
+        conflicts.append(
+            {
+                "id": resource.id,
+                "dwell": dwell,
+                "columns": get_columns(resource.id),
+                "subtrees": [
+                    {"id": resource_id, "columns": get_columns(resource_id)}
+                    for resource_id in resource.lineage
+                ],
+            }
+        )
+    return conflicts
+
+
+def record_request(conflicts):
+    config = settings.RESOURCE_LOCK_CONTENTION
+    return {
+        "keys": get_keys(),
+        "args": [config["SIZE"], config["WINDOW"], json.dumps(conflicts)],
+    }
+
+
+def enabled():
+    # Tracked next to the locks, so only with the Redis engine
+    return settings.RESOURCE_LOCK_CONTENTION["ENABLED"] and isinstance(
+        backends.get_backend(), backends.redis.RedisLockBackend
+    )
+
+
+def record(items, results):
+    # Only lock requests denied because of another holder are recorded. Best
+    # effort, a failure is logged and the lock results stand
+    if not enabled():
+        return
+    conflicts = get_conflicts(items, results)
+    if not conflicts:
+        return
+    try:
+        with metrics.round_trip("contention"):
+            backends.redis.get_script(RECORD_SCRIPT)(**record_request(conflicts))
+    except Exception:
+        logger.exception("Could not record the lock conflicts")
+
+
+async def arecord(items, results):
+    if not enabled():
+        return
+    conflicts = get_conflicts(items, results)
+    if not conflicts:
+        return
+    try:
+        with metrics.round_trip("contention"):
+            await backends.redis.get_async_script(RECORD_SCRIPT)(
+                **record_request(conflicts)
+            )
+    except Exception:
+        logger.exception("Could not record the lock conflicts")
+
+
+def get_report(limit):
+    # Most contended resources with the mean age of the locks that blocked
+    # them, and most contended subtrees, by resource id
+    client = backends.redis.get_client()
+    resources = client.zrevrange(RESOURCES_TOP_KEY, 0, limit - 1, withscores=True)
+    subtrees = client.zrevrange(SUBTREES_TOP_KEY, 0, limit - 1, withscores=True)
+    dwell = (
+        client.hmget(
+            DWELL_KEY,
+            [
+                f"{member.decode()}:{field}"
+                for member, _ in resources
+                for field in ("ms", "n")
+            ],
+        )
+        if resources
+        else []
+    )
+
+    return {
+        "resources": [
+            {
+                "id": int(member),
+                "conflicts": int(score),
+                "mean_dwell_ms": (
+                    round(int(total) / int(count)) if count is not None else None
+                ),
+            }
+            for (member, score), total, count in zip(resources, dwell[::2], dwell[1::2])
+        ],
+        "subtrees": [
+            {"id": int(member), "conflicts": int(score)} for member, score in subtrees
+        ],
+    }
@@ -0,0 +1,66 @@
+from . import locks, subscriptions
+from .backends import redis
+from .models import Resource
+import json, re, time
+
+# Seconds between keep alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+EXPIRED_LOCK_KEY = re.compile(r"^resource_lock_\{\d+\}_(\d+)$")
+
+
+async def parse_event(message):
+    if message["channel"].decode() == redis.EVENTS_CHANNEL:
+        event = json.loads(message["data"])
+        event["expires_at"] = locks.to_iso(event["expires_at"])
+        return event
+
+    # Expired key notification, only the key name is known
+    match = EXPIRED_LOCK_KEY.match(message["data"].decode())
+    if match is None:
+        return None
+
+    resource_id = int(match.group(1))
+    path = (
+        await Resource.objects.filter(pk=resource_id)
+        .values_list("path", flat=True)
+        .afirst()
+    )
+    return {"event": "expired", "id": resource_id, "path": path or ""}
+
+
+def matches(event, ids, subtree):
+    if not ids and subtree is None:
+        return True
+
+    lineage = [
+        int(resource_id) for resource_id in event["path"].split("/") if resource_id
+    ]
+    return event["id"] in ids or subtree in lineage
+
+
+async def lock_events(ids=(), subtree=None):
+    # Lock events of the given resources and of the subtree of a resource, or
+    # of every resource when no filter is given. None is yielded once the
+    # subscription is ready and then whenever the stream has been idle for
+    # HEARTBEAT_INTERVAL seconds
+    client = subscriptions.get_async_client()
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+
+    try:
+        await pubsub.subscribe(redis.EVENTS_CHANNEL, subscriptions.expired_channel())
+        yield None
+        last_sent = time.monotonic()
+
+        while True:
+            message = await pubsub.get_message(timeout=HEARTBEAT_INTERVAL)
+            event = message and await parse_event(message)
+            if event and matches(event, ids, subtree):
+                yield event
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= HEARTBEAT_INTERVAL:
+                yield None
+                last_sent = time.monotonic()
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
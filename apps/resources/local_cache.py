@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import threading, time
+
+
+class LocalCache:
+    # Per process LRU cache with an expiry time per entry. The version is
+    # bumped on every invalidation, values read before one are not cached
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.version = 0
+
+    def get(self, key):
+        return self.get_many([key])[0].get(key)
+
+    def get_many(self, keys):
+        # Cached values, keys still to be read and the version to pass back
+        # to set_many
+        values, missing, now = {}, [], time.monotonic()
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None or entry[1] < now:
+                    self.entries.pop(key, None)
+                    missing.append(key)
+                else:
+                    values[key] = entry[0]
+                    self.entries.move_to_end(key)
+            return values, missing, self.version
+
+    def set(self, key, value, timeout, size, since=None):
+        self.set_many({key: (value, timeout)}, size, since)
+
+    def set_many(self, items, size, since=None):
+        # Key -> (value, timeout) items, skipped when an invalidation happened
+        # since the version was read
+        now = time.monotonic()
+        with self.lock:
+            if since is not None and since != self.version:
+                return
+
+            for key, (value, timeout) in items.items():
+                self.entries[key] = (value, now + timeout)
+                self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        with self.lock:
+            self.version += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def delete_matching(self, match):
+        # Entries whose key and value match
+        with self.lock:
+            self.version += 1
+            for key, (value, _) in list(self.entries.items()):
+                if match(key, value):
+                    del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
@@ -0,0 +1,69 @@
+from . import subscriptions
+from .backends import redis
+from .local_cache import LocalCache
+from django.conf import settings
+import json, time
+
+# Per process near cache of the raw lock records, only read by lock status
+# checks. Entries are dropped as soon as their lock is acquired, renewed,
+# released or expires, in this process directly and in the others through
+# the lock events
+entries = LocalCache()
+
+
+def enabled():
+    return settings.RESOURCE_LOCK_CACHE["ENABLED"] and listener.is_ready()
+
+
+def get_many(keys):
+    # Cached values, keys still to be read from Redis and the version to pass
+    # back to add_many
+    if not enabled():
+        return {}, list(keys), entries.version
+    return entries.get_many(keys)
+
+
+def get_timeout(value, ttl):
+    # A cached lock is never served past its own expiry
+    if value is None:
+        return ttl
+    return min(ttl, redis.lock_expiry(value) - time.time())
+
+
+def add_many(values, since):
+    config = settings.RESOURCE_LOCK_CACHE
+    if not config["ENABLED"] or not listener.ready.is_set():
+        return
+
+    entries.set_many(
+        {
+            key: (value, get_timeout(value, config["TTL"]))
+            for key, value in values.items()
+        },
+        config["SIZE"],
+        since,
+    )
+
+
+def invalidate(keys):
+    entries.delete_many(keys)
+
+
+def clear():
+    entries.clear()
+
+
+def handle(channel, data):
+    if channel == redis.EVENTS_CHANNEL:
+        event = json.loads(data)
+        invalidate([redis.lock_key(event["id"], redis.get_root(event["path"]))])
+    else:
+        invalidate([data.decode()])
+
+
+listener = subscriptions.Listener(
+    "resource-lock-cache",
+    lambda: [redis.EVENTS_CHANNEL, subscriptions.expired_channel()],
+    handle,
+    clear,
+)
@@ -0,0 +1,223 @@
+from . import backends, contention, metrics
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+import time, uuid
+
+# Lock results
+OK = 0
+HELD_BY_OTHER_USER = 1
+WRONG_LOCK_CODE = 2
+HELD_BY_PARENT = 3
+HELD = 4
+HELD_BY_CHILD = 5
+ABORTED = 6
+NOT_LOCKED = 7
+QUEUED = 8
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Acquire results caused by another holder
+CONFLICTS = (HELD, HELD_BY_PARENT, HELD_BY_CHILD)
+
+RESULT_NAMES = {
+    OK: "ok",
+    HELD_BY_OTHER_USER: "held_by_other_user",
+    WRONG_LOCK_CODE: "wrong_lock_code",
+    HELD_BY_PARENT: "held_by_parent",
+    HELD: "held",
+    HELD_BY_CHILD: "held_by_child",
+    ABORTED: "aborted",
+    NOT_LOCKED: "not_locked",
+    QUEUED: "queued",
+}
+
+
+def get_timeout(resource, ttl=None):
+    # Requested or per type timeout, clamped to the configured bounds
+    config = settings.RESOURCE_LOCKS
+    if ttl is None:
+        ttl = config["TYPE_TTLS"].get(resource.type, config["TTL"])
+    return min(max(ttl, config["MIN_TTL"]), config["MAX_TTL"])
+
+
+def to_iso(milliseconds):
+    # Lock times are kept in epoch milliseconds and shown as UTC, which
+    # converts back exactly whatever the local timezone
+    return (EPOCH + timedelta(milliseconds=milliseconds)).isoformat()
+
+
+def to_milliseconds(iso):
+    return (datetime.fromisoformat(iso) - EPOCH) // timedelta(milliseconds=1)
+
+
+def now_milliseconds():
+    return int(time.time() * 1000)
+
+
+def lock_code_bytes(lock_code):
+    # Codes that are not UUIDs can never match a lock
+    try:
+        return uuid.UUID(lock_code).bytes
+    except (TypeError, ValueError):
+        return b""
+
+
+def new_lock(user_id, resource_id, timeout, lock_code=None):
+    now = now_milliseconds()
+    return {
+        "user_id": user_id,
+        "timestamp": to_iso(now),
+        "expires_at": to_iso(now + timeout * 1000),
+        "lock_code": lock_code or str(uuid.uuid4()),
+        "id": resource_id,
+    }
+
+
+def get_status(resource, lock_data):
+    # Lock state of a resource from the nearest lock on it or its ancestors
+    if lock_data is None:
+        return {
+            "locked": False,
+            "locked_by": None,
+            "expires_at": None,
+            "inherited_from": None,
+        }
+
+    return {
+        "locked": True,
+        "locked_by": lock_data.get("user_id"),
+        "expires_at": lock_data.get("expires_at"),
+        "inherited_from": (
+            lock_data.get("id") if lock_data.get("id") != resource.id else None
+        ),
+    }
+
+
+def find_lock(resource):
+    # Nearest lock on the resource or its ancestors
+    return find_locks([resource])[resource.id]
+
+
+def find_locks(resources):
+    # Nearest lock of every resource, by resource id
+    if not resources:
+        return {}
+
+    with metrics.timed("status"):
+        found = backends.get_backend().find_locks(resources)
+    metrics.count("status", [OK] * len(resources))
+    return found
+
+
+async def afind_lock(resource):
+    with metrics.timed("status"):
+        found = await backends.get_backend().afind_locks([resource])
+    metrics.count("status", [OK])
+    return found[resource.id]
+
+
+def acquired(items, results):
+    for resource, _, _ in items:
+        metrics.lock_depth.observe(len(resource.lineage))
+    metrics.count("acquire", [result for result, _ in results])
+    return results
+
+
+def acquire_locks(items, atomic=False):
+    # Checks the ancestors and descendants of every (resource, timeout, lock
+    # record) item and sets the locks, all or nothing when atomic
+    with metrics.timed("acquire"):
+        results = backends.get_backend().acquire_locks(items, atomic)
+    contention.record(items, results)
+    return acquired(items, results)
+
+
+async def aacquire_locks(items, atomic=False):
+    with metrics.timed("acquire"):
+        results = await backends.get_backend().aacquire_locks(items, atomic)
+    await contention.arecord(items, results)
+    return acquired(items, results)
+
+
+def acquire_lock(resource, timeout, lock_data):
+    return acquire_locks([(resource, timeout, lock_data)])[0]
+
+
+async def aacquire_lock(resource, timeout, lock_data):
+    return (await aacquire_locks([(resource, timeout, lock_data)]))[0]
+
+
+def wait_for_lock(resource, user_id, timeout, wait):
+    # Retries until the lock is granted or the wait time is over
+    with metrics.timed("wait"):
+        result = backends.get_backend().wait_for_lock(resource, user_id, timeout, wait)
+    contention.record([(resource, timeout, None)], [result])
+    metrics.lock_depth.observe(len(resource.lineage))
+    metrics.count("wait", [result[0]])
+    return result
+
+
+async def await_for_lock(resource, user_id, timeout, wait):
+    with metrics.timed("wait"):
+        result = await backends.get_backend().await_for_lock(
+            resource, user_id, timeout, wait
+        )
+    await contention.arecord([(resource, timeout, None)], [result])
+    metrics.lock_depth.observe(len(resource.lineage))
+    metrics.count("wait", [result[0]])
+    return result
+
+
+def renew_lock(resource, user_id, lock_code, timeout):
+    # Compares owner and code and extends the lock
+    with metrics.timed("renew"):
+        result = backends.get_backend().renew_lock(
+            resource, user_id, lock_code, timeout
+        )
+    metrics.count("renew", [result[0]])
+    return result
+
+
+async def arenew_lock(resource, user_id, lock_code, timeout):
+    with metrics.timed("renew"):
+        result = await backends.get_backend().arenew_lock(
+            resource, user_id, lock_code, timeout
+        )
+    metrics.count("renew", [result[0]])
+    return result
+
+
+def has_locked_children(resource):
+    return backends.get_backend().has_locked_children(resource)
+
+
+def release_locks(items, user_id, atomic=False):
+    # Compares owner and code of every (resource, lock code) pair and deletes
+    # the locks, all or nothing when atomic
+    with metrics.timed("release"):
+        results = backends.get_backend().release_locks(items, user_id, atomic)
+    metrics.count("release", results)
+    return results
+
+
+async def arelease_locks(items, user_id, atomic=False):
+    with metrics.timed("release"):
+        results = await backends.get_backend().arelease_locks(items, user_id, atomic)
+    metrics.count("release", results)
+    return results
+
+
+def check_locks(items, user_id):
+    # Result of releasing every (resource, lock code) pair, without releasing
+    with metrics.timed("check"):
+        results = backends.get_backend().check_locks(items, user_id)
+    metrics.count("check", results)
+    return results
+
+
+def release_lock(resource, user_id, lock_code):
+    return release_locks([(resource, lock_code)], user_id)[0]
+
+
+async def arelease_lock(resource, user_id, lock_code):
+    return (await arelease_locks([(resource, lock_code)], user_id))[0]
@@ -0,0 +1,231 @@
+from ... import backends, locks
+from ...models import Resource
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+import itertools, json, random, threading, time, uuid
+
+User = get_user_model()
+
+OPERATIONS = ("lock", "unlock", "update")
+
+# Recorded for operations that raised, e.g. database lock timeouts
+ERROR = "error"
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent lock, unlock and update traffic on generated resource "
+        "trees and prints throughput, latency percentiles and conflict rates "
+        "as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", default=settings.RESOURCE_LOCK_BACKEND)
+        parser.add_argument("--trees", type=int, default=10)
+        parser.add_argument("--depth", type=int, default=3)
+        parser.add_argument("--fanout", type=int, default=3)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10, help="Seconds")
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.0,
+            help="Zipf exponent of the resource popularity, 0 for uniform",
+        )
+        parser.add_argument(
+            "--update-ratio",
+            type=float,
+            default=0.5,
+            help="Share of the granted locks followed by a resource update",
+        )
+        parser.add_argument(
+            "--hold", type=float, default=0, help="Seconds a granted lock is held"
+        )
+        parser.add_argument("--ttl", type=int, default=30)
+        parser.add_argument("--seed", type=int)
+        parser.add_argument("--output", help="File to write the JSON report to")
+
+    def handle(self, *args, **options):
+        backend = backends.load_backend(options["backend"])
+        user, _ = User.objects.get_or_create(
+            username="lock-benchmark", defaults={"email": "lock-benchmark@example.com"}
+        )
+        resources = create_trees(
+            user, options["trees"], options["depth"], options["fanout"]
+        )
+
+        # Reported before the cleanup, which should not cost the run
+        try:
+            report = run(backend, user, resources, options)
+            output = json.dumps(report, indent=2)
+            if options["output"]:
+                with open(options["output"], "w") as file:
+                    file.write(output + "\n")
+            self.stdout.write(output)
+        finally:
+            try:
+                delete_trees(resources)
+            except Exception as e:
+                self.stderr.write(f"Could not delete the generated resources: {e}")
+
+
+def create_trees(user, trees, depth, fanout):
+    # Resources level by level, roots first, all of a run share a type
+    resource_type = f"lock-benchmark-{uuid.uuid4().hex[:8]}"
+    counter = itertools.count()
+    resources, parents = [], [None] * trees
+
+    with transaction.atomic():
+        for level in range(depth):
+            level_resources = Resource.objects.bulk_create(
+                [
+                    Resource(
+                        type=resource_type,
+                        name=f"resource-{next(counter)}",
+                        content="",
+                        parent=parent,
+                        created_by=user,
+                        updated_by=user,
+                    )
+                    for parent in parents
+                    for _ in range(1 if level == 0 else fanout)
+                ],
+                batch_size=1000,
+            )
+            for resource in level_resources:
+                resource.path = resource.get_path()
+            Resource.objects.bulk_update(level_resources, ["path"], batch_size=1000)
+            resources += level_resources
+            parents = level_resources
+    return resources
+
+
+def delete_trees(resources):
+    queryset = Resource.objects.filter(pk__in=[resource.id for resource in resources])
+    with transaction.atomic():
+        queryset.update(parent=None)
+        queryset.delete()
+
+
+def get_weights(count, skew, rng):
+    # Cumulative Zipf weights over the resources in a random order, so hot
+    # resources are spread over every level of the trees
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return list(itertools.accumulate(1 / rank**skew for rank in ranks))
+
+
+def percentile(values, share):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def summarize(samples, elapsed):
+    report = {}
+    for operation in OPERATIONS:
+        latencies = sorted(latency for latency, _ in samples[operation])
+        conflicts, errors = {}, 0
+        for _, result in samples[operation]:
+            if result == ERROR:
+                errors += 1
+            elif result != locks.OK:
+                name = locks.RESULT_NAMES[result]
+                conflicts[name] = conflicts.get(name, 0) + 1
+
+        count = len(latencies)
+        report[operation] = {
+            "count": count,
+            "ops_per_second": round(count / elapsed, 2),
+            "p50_ms": percentile(latencies, 0.5),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "conflict_rate": round(sum(conflicts.values()) / count, 4) if count else 0,
+            "conflicts": conflicts,
+            "errors": errors,
+        }
+    return report
+
+
+def run(backend, user, resources, options):
+    rng = random.Random(options["seed"])
+    weights = get_weights(len(resources), options["skew"], rng)
+    samples = {operation: [] for operation in OPERATIONS}
+    samples_lock = threading.Lock()
+    deadline = time.monotonic() + options["duration"]
+    ttl = options["ttl"]
+
+    def measure(call):
+        started = time.perf_counter()
+        try:
+            result = call()
+        except Exception:
+            result = ERROR
+        latency = round((time.perf_counter() - started) * 1000, 3)
+        return latency, result
+
+    def worker(seed):
+        worker_rng = random.Random(seed)
+        worker_samples = {operation: [] for operation in OPERATIONS}
+        try:
+            while time.monotonic() < deadline:
+                resource = worker_rng.choices(resources, cum_weights=weights)[0]
+                lock_data = locks.new_lock(user.id, resource.id, ttl)
+                latency, results = measure(
+                    lambda: backend.acquire_locks([(resource, ttl, lock_data)]),
+                )
+                result = ERROR if results == ERROR else results[0][0]
+                worker_samples["lock"].append((latency, result))
+                if result != locks.OK:
+                    continue
+
+                if worker_rng.random() < options["update_ratio"]:
+                    latency, result = measure(
+                        lambda: Resource.objects.filter(pk=resource.id).update(
+                            content=uuid.uuid4().hex, updated_at=timezone.now()
+                        ),
+                    )
+                    worker_samples["update"].append(
+                        (latency, ERROR if result == ERROR else locks.OK)
+                    )
+                time.sleep(options["hold"])
+
+                latency, results = measure(
+                    lambda: backend.release_locks(
+                        [(resource, lock_data["lock_code"])], user.id
+                    ),
+                )
+                result = ERROR if results == ERROR else results[0]
+                worker_samples["unlock"].append((latency, result))
+        finally:
+            connections.close_all()
+
+        with samples_lock:
+            for operation in OPERATIONS:
+                samples[operation] += worker_samples[operation]
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+        list(executor.map(worker, [rng.random() for _ in range(options["workers"])]))
+    elapsed = time.monotonic() - started
+
+    return {
+        "config": {
+            "backend": options["backend"],
+            "trees": options["trees"],
+            "depth": options["depth"],
+            "fanout": options["fanout"],
+            "resources": len(resources),
+            "workers": options["workers"],
+            "duration": options["duration"],
+            "skew": options["skew"],
+            "update_ratio": options["update_ratio"],
+            "hold": options["hold"],
+        },
+        "elapsed": round(elapsed, 3),
+        "operations": summarize(samples, elapsed),
+    }
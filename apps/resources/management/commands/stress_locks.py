@@ -0,0 +1,223 @@
+from .benchmark_locks import create_trees, delete_trees, get_weights
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from concurrent.futures import ThreadPoolExecutor
+import json, logging, random, threading, time, urllib.error, urllib.request, uuid
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs concurrent lock, unlock and update requests, records every "
+        "granted lock and verifies that no two holders of a resource or of one "
+        "of its ancestors overlapped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--trees", type=int, default=3)
+        parser.add_argument("--depth", type=int, default=3)
+        parser.add_argument("--fanout", type=int, default=2)
+        parser.add_argument("--workers", type=int, default=16)
+        parser.add_argument("--duration", type=float, default=10, help="Seconds")
+        parser.add_argument("--skew", type=float, default=1.0)
+        parser.add_argument(
+            "--hold", type=float, default=0.01, help="Longest hold in seconds"
+        )
+        parser.add_argument(
+            "--update-ratio",
+            type=float,
+            default=0.5,
+            help="Share of the locks released by an update instead of an unlock",
+        )
+        parser.add_argument(
+            "--url",
+            help="Base URL of a running server, e.g. http://localhost:8000, "
+            "requests are handled in this process when not given",
+        )
+        parser.add_argument("--seed", type=int)
+        parser.add_argument("--record", help="File to write the grants to")
+        parser.add_argument(
+            "--verify", help="Only verify the grants recorded in this file"
+        )
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            with open(options["verify"]) as file:
+                grants = [json.loads(line) for line in file]
+            report = {"grants": len(grants), "violations": find_violations(grants)}
+        else:
+            report, grants = self.stress(options)
+            if options["record"]:
+                with open(options["record"], "w") as file:
+                    file.writelines(json.dumps(grant) + "\n" for grant in grants)
+
+        self.stdout.write(json.dumps(report, indent=2))
+        if report["violations"]:
+            raise CommandError(
+                f"{len(report['violations'])} overlapping lock grants found."
+            )
+
+    def stress(self, options):
+        users = [
+            User.objects.get_or_create(
+                username=f"lock-stress-{index}",
+                defaults={"email": f"lock-stress-{index}@example.com"},
+            )[0]
+            for index in range(options["workers"])
+        ]
+        resources = create_trees(
+            users[0], options["trees"], options["depth"], options["fanout"]
+        )
+
+        try:
+            return run(users, resources, options)
+        finally:
+            delete_trees(resources)
+
+
+class LocalClient:
+    # Requests handled by the views in this process
+    def __init__(self, user):
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(user=user)
+
+    def request(self, method, path, data):
+        response = getattr(self.client, method)(path, data, format="json")
+        return response.status_code, getattr(response, "data", None)
+
+
+class RemoteClient:
+    # Requests sent to a running server, authenticated with the user's token
+    def __init__(self, user, url):
+        self.url = url.rstrip("/")
+        self.token = Token.objects.get_or_create(user=user)[0].key
+
+    def request(self, method, path, data):
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(data).encode(),
+            method=method.upper(),
+            headers={
+                "Authorization": f"Token {self.token}",
+                "Content-Type": "application/json",
+            },
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+
+def run(users, resources, options):
+    rng = random.Random(options["seed"])
+    weights = get_weights(len(resources), options["skew"], rng)
+    deadline = time.monotonic() + options["duration"]
+    grants, grants_lock = [], threading.Lock()
+    counts = {"attempts": 0, "denied": 0, "failed_releases": 0}
+
+    def get_client(user):
+        if options["url"]:
+            return RemoteClient(user, options["url"])
+        return LocalClient(user)
+
+    # Denied locks are expected, not worth a warning each
+    logging.getLogger("django.request").setLevel(logging.ERROR)
+
+    def worker(user, seed):
+        worker_rng = random.Random(seed)
+        client = get_client(user)
+        worker_grants, attempts, denied, failed = [], 0, 0, 0
+        try:
+            while time.monotonic() < deadline:
+                resource = worker_rng.choices(resources, cum_weights=weights)[0]
+                attempts += 1
+                status, data = client.request(
+                    "post", f"/api/v1/resources/{resource.id}/lock/", {"ttl": 60}
+                )
+                # The lock is held at least from here until the release is sent
+                granted_at = time.monotonic()
+                if status != 200:
+                    denied += 1
+                    continue
+
+                time.sleep(worker_rng.uniform(0, options["hold"]))
+                released_at = time.monotonic()
+                if worker_rng.random() < options["update_ratio"]:
+                    status, _ = client.request(
+                        "patch",
+                        f"/api/v1/resources/{resource.id}/",
+                        {"content": uuid.uuid4().hex, "lock_code": data["lock_code"]},
+                    )
+                else:
+                    status, _ = client.request(
+                        "post",
+                        f"/api/v1/resources/{resource.id}/unlock/",
+                        {"lock_code": data["lock_code"]},
+                    )
+                failed += status != 200
+
+                worker_grants.append(
+                    {
+                        "id": resource.id,
+                        "path": resource.path,
+                        "user_id": user.id,
+                        "granted_at": granted_at,
+                        "released_at": released_at,
+                    }
+                )
+        finally:
+            connections.close_all()
+
+        with grants_lock:
+            grants.extend(worker_grants)
+            counts["attempts"] += attempts
+            counts["denied"] += denied
+            counts["failed_releases"] += failed
+
+    seeds = [rng.random() for _ in users]
+    with ThreadPoolExecutor(max_workers=len(users)) as executor:
+        list(executor.map(worker, users, seeds))
+
+    report = {
+        "resources": len(resources),
+        "workers": len(users),
+        **counts,
+        "grants": len(grants),
+        "violations": find_violations(grants),
+    }
+    return report, grants
+
+
+def conflicts(first, second):
+    # Same resource, or one is an ancestor of the other
+    return first["path"].startswith(second["path"]) or second["path"].startswith(
+        first["path"]
+    )
+
+
+def find_violations(grants):
+    # Sweeps the grants of every tree in the order they were granted, keeping
+    # the ones still held, any conflicting pair among them is a double grant
+    trees = {}
+    for grant in grants:
+        trees.setdefault(grant["path"].split("/", 1)[0], []).append(grant)
+
+    violations = []
+    for tree in trees.values():
+        held = []
+        for grant in sorted(tree, key=lambda grant: grant["granted_at"]):
+            held = [
+                other for other in held if other["released_at"] > grant["granted_at"]
+            ]
+            violations += [
+                {"first": other, "second": grant}
+                for other in held
+                if conflicts(other, grant)
+            ]
+            held.append(grant)
+    return violations
@@ -0,0 +1,166 @@
+from . import locks, profiling
+from contextlib import contextmanager
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.decorators import sync_and_async_middleware
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+import asyncio, contextvars, hmac, os, time
+
+# Lock operations are sub-millisecond when nothing waits
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+)
+
+lock_operations = Counter(
+    "resource_lock_operations_total",
+    "Lock operations per resource, by result",
+    ["operation", "result"],
+)
+lock_latency = Histogram(
+    "resource_lock_operation_seconds",
+    "Time spent in the lock engine per call",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+lock_depth = Histogram(
+    "resource_lock_depth",
+    "Resource and ancestors checked per lock request",
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50),
+)
+redis_round_trips = Counter(
+    "resource_lock_redis_round_trips_total",
+    "Redis round trips of the Redis lock engine",
+    ["operation"],
+)
+request_queries = Histogram(
+    "http_request_sql_queries",
+    "SQL queries per request",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+
+# Query counter of the request being handled. Context variables follow the
+# request into the sync_to_async threads of async views
+query_count = contextvars.ContextVar("request_query_count", default=None)
+
+
+@contextmanager
+def timed(operation):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        lock_latency.labels(operation).observe(time.perf_counter() - started)
+
+
+@contextmanager
+def round_trip(operation):
+    redis_round_trips.labels(operation).inc()
+    with profiling.span("redis"):
+        yield
+
+
+def count(operation, results):
+    for result in results:
+        lock_operations.labels(operation, locks.RESULT_NAMES[result]).inc()
+
+
+def get_registry():
+    # Every worker process writes its samples to PROMETHEUS_MULTIPROC_DIR,
+    # they are summed up when scraped
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def is_scraper(request):
+    config = settings.METRICS
+    if request.META.get("REMOTE_ADDR") in config["ALLOWED_IPS"]:
+        return True
+    keyword, _, token = request.headers.get("Authorization", "").partition(" ")
+    return bool(
+        config["TOKEN"]
+        and keyword == "Bearer"
+        and hmac.compare_digest(token.encode(), config["TOKEN"].encode())
+    )
+
+
+def metrics_view(request):
+    # Traffic and conflict rates per view are not for API clients
+    if not is_scraper(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
+
+
+def count_query(execute, sql, params, many, context):
+    queries = query_count.get()
+    if queries is not None:
+        queries[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # Sent again when a closed connection reconnects
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def observe_queries(request, queries):
+    if request.resolver_match:
+        request_queries.labels(request.resolver_match.view_name).observe(queries[0])
+
+
+@sync_and_async_middleware
+def query_count_middleware(get_response):
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            queries = [0]
+            token = query_count.set(queries)
+            try:
+                response = await get_response(request)
+            finally:
+                query_count.reset(token)
+            observe_queries(request, queries)
+            return response
+
+    else:
+
+        def middleware(request):
+            queries = [0]
+            token = query_count.set(queries)
+            try:
+                response = get_response(request)
+            finally:
+                query_count.reset(token)
+            observe_queries(request, queries)
+            return response
+
+    return middleware
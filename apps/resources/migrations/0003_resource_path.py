@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Resource = apps.get_model("resources", "Resource")
+    parents = dict(Resource.objects.values_list("id", "parent_id"))
+    paths = {}
+
+    def get_path(resource_id):
+        if resource_id not in paths:
+            parent_id = parents[resource_id]
+            parent_path = get_path(parent_id) if parent_id else ""
+            paths[resource_id] = f"{parent_path}{resource_id}/"
+        return paths[resource_id]
+
+    resources = list(Resource.objects.only("id"))
+    for resource in resources:
+        resource.path = get_path(resource.id)
+    Resource.objects.bulk_update(resources, ["path"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("resources", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="resource",
+            name="path",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=1024
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
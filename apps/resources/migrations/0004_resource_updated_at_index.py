@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("resources", "0003_resource_path"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="resource",
+            index=models.Index(
+                fields=["updated_at", "id"], name="resources_r_updated_75aeaf_idx"
+            ),
+        ),
+    ]
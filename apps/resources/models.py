@@ -1,4 +1,8 @@
-from django.db import models
+from . import ancestry
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -9,6 +13,8 @@ class Resource(models.Model):
     name = models.CharField(blank=False, max_length=100)
     content = models.TextField(blank=False)
     parent = models.ForeignKey("self", null=True, blank=True, on_delete=models.PROTECT)
+    # Materialized path of ids from the root down to this resource, e.g. "1/4/9/"
+    path = models.CharField(max_length=1024, editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.ForeignKey(
         User, on_delete=models.PROTECT, related_name="resources_created"
@@ -20,3 +26,78 @@ class Resource(models.Model):
 
     class Meta:
         unique_together = ("type", "name")
+        indexes = [models.Index(fields=["updated_at", "id"])]
+
+    # Type the instance was loaded with, cached ancestries only go stale when
+    # the type or the path changes
+    loaded_type = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_type = instance.__dict__.get("type")
+        return instance
+
+    @property
+    def lineage(self):
+        # Resource id followed by its ancestors ids, nearest first
+        return [int(resource_id) for resource_id in self.path.split("/")[-2::-1]]
+
+    def get_path(self):
+        if self.parent_id is None:
+            return f"{self.pk}/"
+        elif f"/{self.path}".endswith(f"/{self.parent_id}/{self.pk}/"):
+            # Parent unchanged, no need to load it
+            return self.path
+        return f"{self.parent.path}{self.pk}/"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.pk is None:
+                super().save(*args, **kwargs)
+                self.path = self.get_path()
+                Resource.objects.filter(pk=self.pk).update(path=self.path)
+                self.loaded_type = self.type
+                return
+
+            previous_path, self.path = self.path, self.get_path()
+            super().save(*args, **kwargs)
+
+            # Deferred types were not changed
+            if self.__dict__.get("type", self.loaded_type) != self.loaded_type:
+                ancestry.invalidate(ids=[self.pk])
+                self.loaded_type = self.type
+
+            if previous_path and previous_path != self.path:
+                ancestry.invalidate(paths=[previous_path])
+                # Move the whole subtree along with the resource
+                Resource.objects.filter(path__startswith=previous_path).exclude(
+                    pk=self.pk
+                ).update(
+                    path=Concat(
+                        models.Value(self.path),
+                        Substr("path", len(previous_path) + 1),
+                    )
+                )
+
+
+@receiver(post_delete, sender=Resource)
+def resource_deleted(sender, instance, **kwargs):
+    ancestry.invalidate(ids=[instance.pk])
+
+
+class ResourceLock(models.Model):
+    # Locks of the database lock backend. Rows of deleted resources are left
+    # to expire, like the locks of the other backends
+    resource = models.OneToOneField(
+        Resource,
+        primary_key=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    lock_code = models.UUIDField()
+    # Epoch milliseconds, like the lock records of the other backends
+    timestamp = models.BigIntegerField()
+    expires_at = models.BigIntegerField()
@@ -0,0 +1,34 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class ResourceCursorPagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    ordering_query_param = "ordering"
+    # Keyset orderings, id breaks ties between equal timestamps
+    orderings = {
+        "id": "id",
+        "-id": "-id",
+        "updated_at": ("updated_at", "id"),
+        "-updated_at": ("-updated_at", "-id"),
+    }
+    ordering = "id"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Clients predating pagination get every resource unless they request
+        # a page, when the compatibility setting is on
+        if (
+            settings.RESOURCE_LIST_UNPAGINATED
+            and self.cursor_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = self.orderings.get(
+            request.query_params.get(self.ordering_query_param), self.ordering
+        )
+        return (ordering,) if isinstance(ordering, str) else ordering
@@ -0,0 +1,131 @@
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+import asyncio, contextvars, json, logging, random, time
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("db", "redis", "cache")
+
+# Profile of the sampled request being handled, None otherwise. Context
+# variables follow the request into sync_to_async threads
+current = contextvars.ContextVar("request_profile", default=None)
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.counts = dict.fromkeys(KINDS, 0)
+        self.durations = dict.fromkeys(KINDS, 0.0)
+
+    def add(self, kind, duration):
+        self.counts[kind] += 1
+        self.durations[kind] += duration
+
+    def server_timing(self, total):
+        return ", ".join(
+            [
+                f'{kind};dur={self.durations[kind] * 1000:.2f};desc="{self.counts[kind]}"'
+                for kind in KINDS
+            ]
+            + [f"total;dur={total * 1000:.2f}"]
+        )
+
+
+@contextmanager
+def span(kind):
+    profile = current.get()
+    if profile is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(kind, time.perf_counter() - started)
+
+
+def time_query(execute, sql, params, many, context):
+    with span("db"):
+        return execute(sql, params, many, context)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # Sent again when a closed connection reconnects
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def get_action(request):
+    # DRF viewset action (lock, update, list...) or the view function name
+    match = request.resolver_match
+    if match is None:
+        return None
+    actions = getattr(match.func, "actions", None)
+    if actions:
+        return actions.get(request.method.lower())
+    return match.func.__name__
+
+
+def finish(request, response, profile):
+    total = time.perf_counter() - profile.started
+    response["Server-Timing"] = profile.server_timing(total)
+    logger.info(
+        json.dumps(
+            {
+                "method": request.method,
+                "path": request.path,
+                "action": get_action(request),
+                "status": response.status_code,
+                "total_ms": round(total * 1000, 3),
+                **{
+                    f"{kind}_{field}": value
+                    for kind in KINDS
+                    for field, value in (
+                        ("count", profile.counts[kind]),
+                        ("ms", round(profile.durations[kind] * 1000, 3)),
+                    )
+                },
+            }
+        )
+    )
+    return response
+
+
+@sync_and_async_middleware
+def profiling_middleware(get_response):
+    # Counts and times the queries, Redis and cache calls of a sample of the
+    # requests, sent back as a Server-Timing header and logged as JSON
+    sample_rate = settings.REQUEST_PROFILING["SAMPLE_RATE"]
+    if sample_rate <= 0:
+        raise MiddlewareNotUsed()
+
+    if asyncio.iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            if random.random() >= sample_rate:
+                return await get_response(request)
+            profile = Profile()
+            token = current.set(profile)
+            try:
+                response = await get_response(request)
+            finally:
+                current.reset(token)
+            return finish(request, response, profile)
+
+    else:
+
+        def middleware(request):
+            if random.random() >= sample_rate:
+                return get_response(request)
+            profile = Profile()
+            token = current.set(profile)
+            try:
+                response = get_response(request)
+            finally:
+                current.reset(token)
+            return finish(request, response, profile)
+
+    return middleware
@@ -0,0 +1,10 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class NDJSONRenderer(JSONRenderer):
+    # Newline delimited JSON, errors are rendered as a single line
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context) + b"\n"
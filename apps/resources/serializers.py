@@ -1,11 +1,49 @@
+from . import locks
+from django.conf import settings
 from rest_framework import serializers
 from .models import Resource
 
 
+class ResourceListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        resources = list(data.all() if hasattr(data, "all") else data)
+        if self.context.get("include_lock"):
+            # Lock state of the whole page in a single round trip
+            self.context["locks"] = locks.find_locks(resources)
+        return super().to_representation(resources)
+
+
 class ResourceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Resource
         fields = ["id", "type", "name", "content", "parent"]
+        list_serializer_class = ResourceListSerializer
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Projection requested with the fields query parameter
+        fields = self.context.get("fields")
+        if fields:
+            for field in set(self.fields) - set(fields):
+                self.fields.pop(field)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.context.get("include_lock"):
+            if "locks" in self.context:
+                lock_data = self.context["locks"].get(instance.id)
+            else:
+                lock_data = locks.find_lock(instance)
+            data.update(locks.get_status(instance, lock_data))
+        return data
+
+    def validate_parent(self, parent):
+        if parent and self.instance and self.instance.id in parent.lineage:
+            raise serializers.ValidationError(
+                "A resource cannot be moved under itself or its descendants."
+            )
+        return parent
 
     def create(self, validated_data):
         user = self.context["request"].user
@@ -17,3 +55,77 @@ class ResourceSerializer(serializers.ModelSerializer):
         user = self.context["request"].user
         validated_data["updated_by"] = user
         return super().update(instance, validated_data)
+
+
+class ResourceExportSerializer(serializers.Serializer):
+    updated_after = serializers.DateTimeField(required=False)
+    updated_before = serializers.DateTimeField(required=False)
+
+
+class ContentionSerializer(serializers.Serializer):
+    limit = serializers.IntegerField(required=False, min_value=1, default=20)
+
+
+class LockSerializer(serializers.Serializer):
+    ttl = serializers.IntegerField(required=False, min_value=1)
+    wait = serializers.IntegerField(required=False, min_value=0, default=0)
+
+
+class RenewLockSerializer(serializers.Serializer):
+    ttl = serializers.IntegerField(required=False, min_value=1)
+    lock_code = serializers.CharField()
+
+
+class BulkListField(serializers.ListField):
+    # Bulk requests are capped by a setting, read when the request is
+    # validated
+    def __init__(self, setting, **kwargs):
+        self.setting = setting
+        super().__init__(allow_empty=False, **kwargs)
+
+    def to_internal_value(self, data):
+        max_length = getattr(settings, self.setting)
+        if isinstance(data, (list, tuple)) and len(data) > max_length:
+            self.fail("max_length", max_length=max_length)
+        return super().to_internal_value(data)
+
+
+class BulkLockSerializer(serializers.Serializer):
+    ttl = serializers.IntegerField(required=False, min_value=1)
+    ids = BulkListField("RESOURCE_BULK_MAX_ITEMS", child=serializers.IntegerField())
+    atomic = serializers.BooleanField(default=False)
+
+
+class LockCodeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    lock_code = serializers.CharField(required=False, allow_blank=True)
+
+
+class BulkUnlockSerializer(serializers.Serializer):
+    locks = BulkListField("RESOURCE_BULK_MAX_ITEMS", child=LockCodeSerializer())
+    atomic = serializers.BooleanField(default=False)
+
+
+class BulkCreateSerializer(serializers.Serializer):
+    items = BulkListField(
+        "RESOURCE_BULK_MAX_WRITE_ITEMS", child=serializers.DictField()
+    )
+    atomic = serializers.BooleanField(default=False)
+
+
+class BulkUpdateItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    lock_code = serializers.CharField(required=False, allow_blank=True)
+    changes = serializers.DictField()
+
+
+class BulkUpdateSerializer(serializers.Serializer):
+    items = BulkListField(
+        "RESOURCE_BULK_MAX_WRITE_ITEMS", child=BulkUpdateItemSerializer()
+    )
+    atomic = serializers.BooleanField(default=False)
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+    items = BulkListField("RESOURCE_BULK_MAX_WRITE_ITEMS", child=LockCodeSerializer())
+    atomic = serializers.BooleanField(default=False)
@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from redis.connection import parse_url
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import redis, redis.asyncio, threading, time
+
+
+def get_url():
+    # Redis of the lock engine, where the lock events, the expiry
+    # notifications and the ancestry invalidations are published. The cache
+    # stays on its own standalone Redis with Redis Cluster, which only has
+    # database 0
+    if not settings.RESOURCE_LOCK_REDIS_CLUSTER:
+        return settings.CACHES["default"]["LOCATION"]
+
+    if not settings.RESOURCE_LOCK_REDIS_CLUSTER_URL:
+        raise ImproperlyConfigured(
+            "RESOURCE_LOCK_REDIS_CLUSTER_URL must be set to a node of the "
+            "Redis Cluster."
+        )
+    url = urlsplit(settings.RESOURCE_LOCK_REDIS_CLUSTER_URL)
+    query = [(key, value) for key, value in parse_qsl(url.query) if key != "db"]
+    return url._replace(path="", query=urlencode(query)).geturl()
+
+
+def get_client():
+    # Dedicated connection without a read timeout, subscribers block until a
+    # message arrives
+    config = settings.CACHES["default"]
+    return redis.Redis.from_url(
+        get_url(),
+        socket_connect_timeout=config["OPTIONS"].get("SOCKET_CONNECT_TIMEOUT"),
+        socket_keepalive=True,
+    )
+
+
+def get_async_client():
+    # Same for asyncio subscribers. A plain node connection also on Redis
+    # Cluster, where messages published on any node reach every node and the
+    # cluster client has no pub/sub
+    config = settings.CACHES["default"]
+    return redis.asyncio.Redis.from_url(
+        get_url(),
+        socket_connect_timeout=config["OPTIONS"].get("SOCKET_CONNECT_TIMEOUT"),
+        socket_keepalive=True,
+    )
+
+
+def expired_channel():
+    # Keyspace notifications of the expired keys, need notify-keyspace-events Ex
+    db = parse_url(get_url()).get("db", 0)
+    return f"__keyevent@{db}__:expired"
+
+
+def listen(channels, handle, ready, reset):
+    client = get_client()
+    while True:
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(*channels)
+            # Messages may have been missed while not subscribed
+            reset()
+            ready.set()
+
+            for message in pubsub.listen():
+                if message["type"] == "message":
+                    handle(message["channel"].decode(), message["data"])
+        except Exception:
+            ready.clear()
+            time.sleep(1)
+
+
+def start(name, channels, handle, ready, reset):
+    # Daemon thread keeping a subscription open for the life of the process,
+    # ready is only set while it is subscribed
+    thread = threading.Thread(
+        target=listen, args=(channels, handle, ready, reset), name=name, daemon=True
+    )
+    thread.start()
+    return thread
+
+
+class Listener:
+    # Subscription keeping a local cache in sync, started on first use. The
+    # cache is reset whenever messages may have been missed, channels are
+    # only read when the subscription starts
+    def __init__(self, name, get_channels, handle, reset):
+        self.name = name
+        self.get_channels = get_channels
+        self.handle = handle
+        self.reset = reset
+        self.ready = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = start(
+                        self.name,
+                        self.get_channels(),
+                        self.handle,
+                        self.ready,
+                        self.reset,
+                    )
+
+    def is_ready(self):
+        self.start()
+        return self.ready.is_set()
@@ -0,0 +1,38 @@
+from .. import ancestry, lock_cache
+from ..models import Resource
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+import uuid
+
+User = get_user_model()
+
+
+class ResourceTreeMixin:
+    # Two users, a parent with a child and an unrelated resource
+    def setUp(self):
+        self.client = APIClient()
+        self.user1 = User.objects.create_user(
+            username="user1", password="password1", email="test1@test.com"
+        )
+        self.user2 = User.objects.create_user(
+            username="user2", password="password2", email="test2@test.com"
+        )
+        self.parent = self.create_resource()
+        self.child = self.create_resource(parent=self.parent)
+        self.other = self.create_resource()
+
+    def tearDown(self):
+        cache.clear()
+        ancestry.clear()
+        lock_cache.clear()
+
+    def create_resource(self, parent=None):
+        return Resource.objects.create(
+            type=f"Example type {uuid.uuid4()}",
+            name=f"Example name {uuid.uuid4()}",
+            content=f"Example content {uuid.uuid4()}",
+            parent=parent,
+            created_by=self.user1,
+            updated_by=self.user1,
+        )
@@ -0,0 +1,114 @@
+from .. import ancestry
+from ..backends import redis
+from .base import ResourceTreeMixin
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework import status
+from unittest import mock
+import json, time
+
+
+class ResourceAncestryCacheTest(ResourceTreeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user1)
+        ancestry.listener.start()
+        self.assertTrue(ancestry.listener.ready.wait(5))
+
+    def test_cached_lock_requests(self):
+        response = self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                f"/api/v1/resources/{self.child.id}/unlock/",
+                {"lock_code": response.data["lock_code"]},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post("/api/v1/resources/0/lock/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response.data.get("error"), "No Resource matches the given query."
+        )
+
+    def test_moved_resource(self):
+        self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        response = self.client.post(f"/api/v1/resources/{self.parent.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIsNotNone(ancestry.get(self.child.id))
+        cache.clear()
+
+        self.parent.parent = self.other
+        self.parent.save()
+        self.assertIsNone(ancestry.get(self.child.id))
+
+        # The lock is indexed under the new ancestors
+        response = self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(f"/api/v1/resources/{self.other.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response.data.get("error"), "Child resource is currently locked."
+        )
+
+    def test_broadcast_invalidation(self):
+        self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        self.client.post(f"/api/v1/resources/{self.other.id}/lock/")
+
+        # Published by another process once its change is committed
+        redis.get_client().publish(
+            ancestry.CHANNEL, json.dumps({"ids": [], "paths": [self.parent.path]})
+        )
+        deadline = time.time() + 5
+        while ancestry.get(self.child.id) is not None and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertIsNone(ancestry.get(self.child.id))
+        self.assertIsNotNone(ancestry.get(self.other.id))
+
+    def test_invalidated_while_loading(self):
+        since = ancestry.get_version()
+        ancestry.invalidate(ids=[self.child.id])
+        ancestry.add(self.child, since)
+        self.assertIsNone(ancestry.get(self.child.id))
+
+    @override_settings(
+        RESOURCE_LOCK_BACKEND="apps.resources.backends.memory.MemoryLockBackend"
+    )
+    def test_failed_publish(self):
+        response = self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        client = mock.Mock()
+        client.publish.side_effect = ConnectionError("Redis is down.")
+
+        with mock.patch.object(redis, "get_client", return_value=client):
+            with self.assertLogs("django.test", "ERROR"):
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.patch(
+                        f"/api/v1/resources/{self.child.id}/",
+                        {"type": "new", "lock_code": response.data["lock_code"]},
+                    )
+
+        # The invalidation is best effort, the update stands
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.child.refresh_from_db()
+        self.assertEqual(self.child.type, "new")
+        self.assertTrue(client.publish.called)
+
+    def test_content_update(self):
+        self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        self.assertIsNotNone(ancestry.get(self.child.id))
+        version = ancestry.get_version()
+
+        with mock.patch.object(redis, "get_client") as get_client:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.child.content = "new"
+                self.child.save()
+
+        # Neither the type nor the path changed
+        self.assertEqual(ancestry.get_version(), version)
+        self.assertIsNotNone(ancestry.get(self.child.id))
+        get_client.assert_not_called()
+
+        self.child.type = "new"
+        self.child.save()
+        self.assertIsNone(ancestry.get(self.child.id))
@@ -0,0 +1,106 @@
+from .. import ancestry
+from ..backends import redis
+from .base import ResourceTreeMixin
+from apps.users.authentication import get_cached_user
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+
+class ResourceAsyncLocksTest(ResourceTreeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.token1 = Token.objects.create(user=self.user1)
+        self.token2 = Token.objects.create(user=self.user2)
+        self.url = f"/api/v1/async/resources/{self.other.id}"
+
+    def test_lock_cycle(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token1.key}")
+        response = self.client.get(f"{self.url}/status/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.json()["locked"])
+
+        response1 = self.client.post(f"{self.url}/lock/", {"ttl": 60}, format="json")
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+        lock_code = response1.json()["lock_code"]
+
+        response = self.client.get(f"{self.url}/status/")
+        self.assertEqual(
+            response.json(),
+            {
+                "locked": True,
+                "locked_by": self.user1.id,
+                "expires_at": response1.json()["expires_at"],
+                "inherited_from": None,
+            },
+        )
+
+        # Locks are shared with the sync API
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.post(f"/api/v1/resources/{self.other.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data.get("error"), "Resource is currently locked.")
+        self.client.force_authenticate(user=None)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token1.key}")
+        response = self.client.post(f"{self.url}/renew/", {"lock_code": lock_code})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["lock_code"], lock_code)
+
+        # Validate when user 2 tries to unlock
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token2.key}")
+        response = self.client.post(f"{self.url}/unlock/", {"lock_code": lock_code})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response.json()["error"],
+            "Another user is currently editing this resource.",
+        )
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token1.key}")
+        response = self.client.post(f"{self.url}/unlock/", {"lock_code": lock_code})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["message"], "Resource unlocked successfully.")
+
+        response = self.client.get(f"{self.url}/status/")
+        self.assertFalse(response.json()["locked"])
+
+    def test_unauthorized_access(self):
+        response = self.client.post(f"{self.url}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token fake_token")
+        response = self.client.get(f"{self.url}/status/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token1.key}")
+        response = self.client.get(f"{self.url}/status/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_cached_user(self.token1.key).id, self.user1.id)
+
+        # Only the resource is loaded
+        ancestry.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{self.url}/status/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Deactivating the user drops the cached token
+        self.user1.is_active = False
+        self.user1.save()
+        response = self.client.get(f"{self.url}/status/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unknown_resource(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token1.key}")
+        response = self.client.post("/api/v1/async/resources/0/lock/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_async_clients_released(self):
+        async def get_client():
+            return redis.get_async_client()
+
+        # Every async_to_sync call outside a loop runs on a new one
+        for _ in range(3):
+            async_to_sync(get_client)()
+        self.assertEqual(redis.async_clients, {})
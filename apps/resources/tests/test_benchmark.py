@@ -0,0 +1,105 @@
+from .. import ancestry, lock_cache
+from ..models import Resource
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from unittest import mock
+import copy, io, json, os, tempfile
+
+
+class BenchmarkLocksCommandTest(TestCase):
+    def tearDown(self):
+        cache.clear()
+        ancestry.clear()
+        lock_cache.clear()
+
+    def test_report(self):
+        out = io.StringIO()
+        call_command(
+            "benchmark_locks",
+            backend="apps.resources.backends.memory.MemoryLockBackend",
+            trees=2,
+            depth=3,
+            fanout=2,
+            workers=2,
+            duration=0.2,
+            update_ratio=0,
+            seed=1,
+            stdout=out,
+        )
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report["config"]["resources"], 14)
+        lock = report["operations"]["lock"]
+        self.assertGreater(lock["count"], 0)
+        self.assertLessEqual(lock["p50_ms"], lock["p99_ms"])
+        self.assertEqual(lock["errors"], 0)
+        self.assertEqual(
+            report["operations"]["unlock"]["count"],
+            lock["count"] - sum(lock["conflicts"].values()),
+        )
+        # Generated trees are removed afterwards
+        self.assertFalse(Resource.objects.exists())
+
+
+class BenchmarkLocksWithoutRedisTest(TransactionTestCase):
+    def tearDown(self):
+        cache.clear()
+        ancestry.clear()
+        lock_cache.clear()
+
+    def test_report(self):
+        # Nothing listens on the port, committed deletes publish their
+        # ancestry invalidations
+        caches = copy.deepcopy(settings.CACHES)
+        caches["default"]["LOCATION"] = "redis://127.0.0.1:6399/1"
+        caches["default"]["OPTIONS"]["SOCKET_CONNECT_TIMEOUT"] = 1
+        out = io.StringIO()
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            with override_settings(CACHES=caches), self.assertLogs(
+                "django.db.backends.base", "ERROR"
+            ):
+                call_command(
+                    "benchmark_locks",
+                    backend="apps.resources.backends.memory.MemoryLockBackend",
+                    trees=1,
+                    depth=2,
+                    fanout=2,
+                    workers=1,
+                    duration=0.2,
+                    seed=1,
+                    output=output,
+                    stdout=out,
+                )
+            with open(output) as file:
+                report = json.load(file)
+
+        self.assertEqual(report, json.loads(out.getvalue()))
+        self.assertEqual(report["config"]["resources"], 3)
+        self.assertGreater(report["operations"]["lock"]["count"], 0)
+        self.assertFalse(Resource.objects.exists())
+
+    def test_failed_cleanup(self):
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch(
+            "apps.resources.management.commands.benchmark_locks.delete_trees",
+            side_effect=ConnectionError("unavailable"),
+        ):
+            call_command(
+                "benchmark_locks",
+                backend="apps.resources.backends.memory.MemoryLockBackend",
+                trees=1,
+                depth=1,
+                workers=1,
+                duration=0.1,
+                update_ratio=0,
+                seed=1,
+                stdout=out,
+                stderr=err,
+            )
+
+        self.assertEqual(json.loads(out.getvalue())["config"]["resources"], 1)
+        self.assertIn("Could not delete the generated resources", err.getvalue())
@@ -0,0 +1,164 @@
+from .base import ResourceTreeMixin
+from django.test import TestCase, override_settings
+from rest_framework import status
+
+
+class ResourceBulkLocksTest(ResourceTreeMixin, TestCase):
+    def test_bulk_lock(self):
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            "/api/v1/resources/bulk_lock/",
+            {"ids": [self.child.id, self.other.id]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(
+            [item["id"] for item in results], [self.child.id, self.other.id]
+        )
+        self.assertIsInstance(results[0]["lock_code"], str)
+        self.assertIsInstance(results[1]["lock_code"], str)
+
+        # Locks are the same as the ones taken one by one
+        response = self.client.post(f"/api/v1/resources/{self.parent.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response.data.get("error"), "Child resource is currently locked."
+        )
+
+        response = self.client.post(
+            f"/api/v1/resources/{self.other.id}/unlock/",
+            {"lock_code": results[1]["lock_code"]},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_best_effort_bulk_lock(self):
+        self.client.force_authenticate(user=self.user1)
+        self.client.post(f"/api/v1/resources/{self.other.id}/lock/")
+
+        response = self.client.post(
+            "/api/v1/resources/bulk_lock/",
+            {"ids": [self.parent.id, self.child.id, self.other.id, 0]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertIn("lock_code", results[0])
+        self.assertEqual(results[1]["error"], "Parent resource is currently locked.")
+        self.assertEqual(results[2]["error"], "Resource is currently locked.")
+        self.assertEqual(results[3]["error"], "Resource not found.")
+
+    def test_atomic_bulk_lock(self):
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            "/api/v1/resources/bulk_lock/",
+            {"ids": [self.other.id, self.parent.id, self.child.id], "atomic": True},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        results = response.data["results"]
+        self.assertEqual(results[0]["error"], "Another resource in the batch failed.")
+        self.assertEqual(results[1]["error"], "Another resource in the batch failed.")
+        self.assertEqual(results[2]["error"], "Parent resource is currently locked.")
+
+        # Nothing stays locked
+        response = self.client.post(
+            "/api/v1/resources/bulk_lock/",
+            {"ids": [self.other.id, self.parent.id], "atomic": True},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_bulk_unlock(self):
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            "/api/v1/resources/bulk_lock/",
+            {"ids": [self.child.id, self.other.id]},
+            format="json",
+        )
+        child_code, other_code = [
+            item["lock_code"] for item in response.data["results"]
+        ]
+
+        # Atomic unlock with one wrong code releases nothing
+        response = self.client.post(
+            "/api/v1/resources/bulk_unlock/",
+            {
+                "locks": [
+                    {"id": self.child.id, "lock_code": child_code},
+                    {"id": self.other.id, "lock_code": "fake_code"},
+                ],
+                "atomic": True,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        results = response.data["results"]
+        self.assertEqual(results[0]["error"], "Another resource in the batch failed.")
+        self.assertEqual(results[1]["error"], "Lock code incorrect.")
+
+        # Another user cannot release them
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.post(
+            "/api/v1/resources/bulk_unlock/",
+            {"locks": [{"id": self.child.id, "lock_code": child_code}]},
+            format="json",
+        )
+        self.assertEqual(
+            response.data["results"][0]["error"],
+            "Another user is currently editing this resource.",
+        )
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            "/api/v1/resources/bulk_unlock/",
+            {
+                "locks": [
+                    {"id": self.child.id, "lock_code": child_code},
+                    {"id": self.other.id, "lock_code": other_code},
+                ],
+                "atomic": True,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for item in response.data["results"]:
+            self.assertEqual(item["message"], "Resource unlocked successfully.")
+
+        response = self.client.post(f"/api/v1/resources/{self.parent.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(RESOURCE_BULK_MAX_ITEMS=3, RESOURCE_BULK_MAX_WRITE_ITEMS=5)
+    def test_batch_size(self):
+        self.client.force_authenticate(user=self.user1)
+        ids = list(range(1, 5))
+        requests = [
+            ("bulk_lock", {"ids": ids}),
+            ("bulk_unlock", {"locks": [{"id": pk} for pk in ids]}),
+        ]
+        write_ids = list(range(1, 7))
+        write_requests = [
+            ("bulk_create", {"items": [{} for pk in write_ids]}),
+            (
+                "bulk_update",
+                {"items": [{"id": pk, "changes": {}} for pk in write_ids]},
+            ),
+            ("bulk_delete", {"items": [{"id": pk} for pk in write_ids]}),
+        ]
+        for url, data in requests + write_requests:
+            response = self.client.post(
+                f"/api/v1/resources/{url}/", data, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Writes take more items than locks
+        response = self.client.post(
+            "/api/v1/resources/bulk_update/",
+            {"items": [{"id": pk, "changes": {}} for pk in ids]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(
+            "/api/v1/resources/bulk_lock/", {"ids": ids[:-1]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
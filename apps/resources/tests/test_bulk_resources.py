@@ -0,0 +1,341 @@
+from .. import locks
+from ..models import Resource
+from ..views import ResourceViewSet
+from .base import ResourceTreeMixin
+from django.test import TestCase
+from rest_framework import status
+from unittest import mock
+
+
+class ResourceBulkRequestsTest(ResourceTreeMixin, TestCase):
+    def lock(self, resource):
+        response = self.client.post(f"/api/v1/resources/{resource.id}/lock/")
+        return response.data["lock_code"]
+
+    def test_bulk_create(self):
+        self.client.force_authenticate(user=self.user2)
+        items = [
+            {
+                "type": "Example",
+                "name": "First",
+                "content": "1",
+                "parent": self.child.id,
+            },
+            {"type": "Example", "name": "Second", "content": "2"},
+            {"type": "Example", "name": "First", "content": "3"},
+            {"type": "Example", "content": "4"},
+        ]
+
+        with self.assertNumQueries(8):
+            response = self.client.post(
+                "/api/v1/resources/bulk_create/", {"items": items}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(results[0]["name"], "First")
+        self.assertEqual(results[1]["parent"], None)
+        self.assertIn("non_field_errors", results[2]["error"])
+        self.assertIn("name", results[3]["error"])
+
+        resource = Resource.objects.get(pk=results[0]["id"])
+        self.assertEqual(resource.path, f"{self.child.path}{resource.id}/")
+        self.assertEqual(resource.created_by, self.user2)
+
+        # Nothing is created when an atomic batch fails
+        response = self.client.post(
+            "/api/v1/resources/bulk_create/",
+            {"items": [{**items[1], "name": "Third"}, items[3]], "atomic": True},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response.data["results"][0]["error"],
+            "Another resource in the batch failed.",
+        )
+        self.assertFalse(Resource.objects.filter(name="Third").exists())
+
+    def test_bulk_update(self):
+        self.client.force_authenticate(user=self.user1)
+        lock_code = self.lock(self.child)
+        self.lock(self.other)
+
+        response = self.client.post(
+            "/api/v1/resources/bulk_update/",
+            {
+                "items": [
+                    {
+                        "id": self.child.id,
+                        "lock_code": lock_code,
+                        "changes": {"content": "Updated"},
+                    },
+                    {"id": self.other.id, "changes": {"content": "Updated"}},
+                    {"id": self.parent.id, "changes": {"parent": self.child.id}},
+                    {"id": 0, "changes": {}},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(results[0]["content"], "Updated")
+        self.assertEqual(results[1]["error"], "Lock code incorrect.")
+        self.assertIn("parent", results[2]["error"])
+        self.assertEqual(results[3]["error"], "Resource not found.")
+
+        self.child.refresh_from_db()
+        self.assertEqual(self.child.content, "Updated")
+        self.assertGreater(self.child.updated_at, self.child.created_at)
+        self.other.refresh_from_db()
+        self.assertNotEqual(self.other.content, "Updated")
+
+        # Lock released by the update
+        response = self.client.post(f"/api/v1/resources/{self.parent.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_bulk_update_move(self):
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            "/api/v1/resources/bulk_update/",
+            {
+                "items": [
+                    {"id": self.parent.id, "changes": {"parent": self.other.id}},
+                    {"id": self.other.id, "changes": {"name": "Renamed"}},
+                ],
+                "atomic": True,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.child.refresh_from_db()
+        self.assertEqual(
+            self.child.path, f"{self.other.id}/{self.parent.id}/{self.child.id}/"
+        )
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.name, "Renamed")
+
+    def test_bulk_update_move_locked(self):
+        self.client.force_authenticate(user=self.user1)
+        lock_code = self.lock(self.child)
+
+        response = self.client.post(
+            "/api/v1/resources/bulk_update/",
+            {
+                "items": [
+                    {
+                        "id": self.child.id,
+                        "lock_code": lock_code,
+                        "changes": {"parent": self.other.id},
+                    }
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.child.refresh_from_db()
+        self.assertEqual(self.child.path, f"{self.other.id}/{self.child.id}/")
+
+        # The lock is released under the old parent
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.post(f"/api/v1/resources/{self.parent.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_bulk_update_dependent_moves(self):
+        self.client.force_authenticate(user=self.user1)
+        leaf = self.create_resource()
+
+        # The second move lands under the resource moved by the first
+        response = self.client.post(
+            "/api/v1/resources/bulk_update/",
+            {
+                "items": [
+                    {"id": self.parent.id, "changes": {"parent": self.other.id}},
+                    {"id": leaf.id, "changes": {"parent": self.parent.id}},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertNotIn("error", results[0])
+        self.assertEqual(
+            results[1]["error"],
+            "Cannot move a resource within the subtree of another resource moved "
+            "in the batch.",
+        )
+        leaf.refresh_from_db()
+        self.assertEqual(leaf.path, f"{leaf.id}/")
+        self.child.refresh_from_db()
+        self.assertEqual(
+            self.child.path, f"{self.other.id}/{self.parent.id}/{self.child.id}/"
+        )
+
+        # Two resources moved under each other would form a cycle
+        response = self.client.post(
+            "/api/v1/resources/bulk_update/",
+            {
+                "items": [
+                    {"id": leaf.id, "changes": {"parent": self.other.id}},
+                    {"id": self.other.id, "changes": {"parent": leaf.id}},
+                ],
+                "atomic": True,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        leaf.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertIsNone(leaf.parent_id)
+        self.assertIsNone(self.other.parent_id)
+
+    def test_bulk_update_duplicate_names(self):
+        self.client.force_authenticate(user=self.user1)
+        child_code = self.lock(self.child)
+        other_code = self.lock(self.other)
+        self.other.type = self.child.type
+        self.other.save()
+
+        response = self.client.post(
+            "/api/v1/resources/bulk_update/",
+            {
+                "items": [
+                    {
+                        "id": self.child.id,
+                        "lock_code": child_code,
+                        "changes": {"name": "Same"},
+                    },
+                    {
+                        "id": self.other.id,
+                        "lock_code": other_code,
+                        "changes": {"name": "Same"},
+                    },
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(results[0]["name"], "Same")
+        self.assertIn("non_field_errors", results[1]["error"])
+
+        # Only the written resource is unlocked
+        response = self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(f"/api/v1/resources/{self.other.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_failed_write_keeps_locks(self):
+        self.client.force_authenticate(user=self.user1)
+        lock_code = self.lock(self.child)
+
+        with mock.patch.object(
+            ResourceViewSet, "update_resources", side_effect=Exception("Failed.")
+        ):
+            response = self.client.post(
+                "/api/v1/resources/bulk_update/",
+                {
+                    "items": [
+                        {
+                            "id": self.child.id,
+                            "lock_code": lock_code,
+                            "changes": {"content": "Updated"},
+                        }
+                    ]
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_atomic_bulk_update(self):
+        self.client.force_authenticate(user=self.user2)
+        self.lock(self.other)
+
+        self.client.force_authenticate(user=self.user1)
+        lock_code = self.lock(self.child)
+        response = self.client.post(
+            "/api/v1/resources/bulk_update/",
+            {
+                "items": [
+                    {
+                        "id": self.child.id,
+                        "lock_code": lock_code,
+                        "changes": {"content": "Updated"},
+                    },
+                    {"id": self.other.id, "changes": {"content": "Updated"}},
+                ],
+                "atomic": True,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        results = response.data["results"]
+        self.assertEqual(results[0]["error"], "Another resource in the batch failed.")
+        self.assertEqual(
+            results[1]["error"], "Another user is currently editing this resource."
+        )
+        self.assertFalse(Resource.objects.filter(content="Updated").exists())
+
+        # The lock is kept
+        response = self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_delete(self):
+        self.client.force_authenticate(user=self.user1)
+        lock_code = self.lock(self.other)
+
+        response = self.client.post(
+            "/api/v1/resources/bulk_delete/",
+            {"items": [{"id": self.parent.id}, {"id": self.other.id}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(
+            results[0]["error"], "Cannot delete a resource while it has children."
+        )
+        self.assertEqual(results[1]["error"], "Lock code incorrect.")
+
+        response = self.client.post(
+            "/api/v1/resources/bulk_delete/",
+            {
+                "items": [
+                    {"id": self.parent.id},
+                    {"id": self.child.id},
+                    {"id": self.other.id, "lock_code": lock_code},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Resource.objects.exists())
+
+    def test_bulk_delete_failed_child(self):
+        self.client.force_authenticate(user=self.user1)
+        parent_code = self.lock(self.parent)
+
+        response = self.client.post(
+            "/api/v1/resources/bulk_delete/",
+            {
+                "items": [
+                    {"id": self.parent.id, "lock_code": parent_code},
+                    {"id": self.child.id, "lock_code": "fake_code"},
+                    {"id": self.other.id},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(
+            results[0]["error"], "Cannot delete a resource while it has children."
+        )
+        self.assertEqual(results[1]["error"], "Lock code incorrect.")
+        self.assertEqual(results[2]["message"], "Resource deleted successfully.")
+
+        # The refused parent keeps its lock
+        self.assertTrue(Resource.objects.filter(pk=self.parent.id).exists())
+        self.assertIsNotNone(locks.find_lock(self.parent))
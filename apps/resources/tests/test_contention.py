@@ -0,0 +1,109 @@
+from .. import backends, contention, locks
+from .base import ResourceTreeMixin
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework import status
+from unittest import mock
+import redis
+
+
+@override_settings(
+    RESOURCE_LOCK_BACKEND="apps.resources.backends.redis.RedisLockBackend"
+)
+class ContentionTest(ResourceTreeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Conflicts counted by other tests
+        cache.clear()
+
+    def lock(self, resource, user):
+        return locks.acquire_lock(
+            resource, 60, locks.new_lock(user.id, resource.id, 60)
+        )
+
+    def test_report(self):
+        self.lock(self.parent, self.user1)
+        self.lock(self.other, self.user1)
+        self.lock(self.child, self.user2)
+        self.lock(self.child, self.user2)
+        self.lock(self.parent, self.user2)
+
+        report = contention.get_report(10)
+        self.assertEqual(
+            [(row["id"], row["conflicts"]) for row in report["resources"]],
+            [(self.child.id, 2), (self.parent.id, 1)],
+        )
+        self.assertIsNotNone(report["resources"][0]["mean_dwell_ms"])
+        self.assertEqual(
+            [(row["id"], row["conflicts"]) for row in report["subtrees"]],
+            [(self.parent.id, 3), (self.child.id, 2)],
+        )
+
+    @override_settings(
+        RESOURCE_LOCK_CONTENTION={
+            "ENABLED": True,
+            "WIDTH": 64,
+            "DEPTH": 2,
+            "SIZE": 1,
+            "WINDOW": 60,
+        }
+    )
+    def test_top_size(self):
+        self.lock(self.parent, self.user1)
+        self.lock(self.other, self.user1)
+        self.lock(self.parent, self.user2)
+        self.lock(self.other, self.user2)
+        self.lock(self.other, self.user2)
+
+        report = contention.get_report(10)
+        self.assertEqual(
+            [(row["id"], row["conflicts"]) for row in report["resources"]],
+            [(self.other.id, 2)],
+        )
+
+    def test_endpoint(self):
+        self.lock(self.child, self.user1)
+        self.lock(self.child, self.user2)
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get("/api/v1/resources/contention/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user1.is_staff = True
+        self.user1.save()
+        response = self.client.get("/api/v1/resources/contention/", {"limit": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["resources"][0]["id"], self.child.id)
+        self.assertEqual(response.data["resources"][0]["path"], self.child.path)
+        self.assertEqual(len(response.data["subtrees"]), 1)
+
+    def test_failed_record(self):
+        get_script = backends.redis.get_script
+
+        def failing_script(script):
+            if script == contention.RECORD_SCRIPT:
+                raise redis.exceptions.ConnectionError("unavailable")
+            return get_script(script)
+
+        self.lock(self.parent, self.user1)
+        with mock.patch.object(
+            backends.redis, "get_script", side_effect=failing_script
+        ), self.assertLogs("apps.resources.contention", "ERROR"):
+            result = self.lock(self.child, self.user2)
+
+        self.assertEqual(result[0], locks.HELD_BY_PARENT)
+
+    @override_settings(
+        RESOURCE_LOCK_BACKEND="apps.resources.backends.memory.MemoryLockBackend"
+    )
+    def test_other_engines(self):
+        self.lock(self.parent, self.user1)
+        try:
+            with mock.patch.object(backends.redis, "get_script") as get_script:
+                result = self.lock(self.child, self.user2)
+        finally:
+            backends.get_backend().clear()
+
+        self.assertEqual(result[0], locks.HELD_BY_PARENT)
+        get_script.assert_not_called()
+        self.assertEqual(contention.get_report(10)["resources"], [])
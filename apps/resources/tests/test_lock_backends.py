@@ -0,0 +1,286 @@
+from .. import backends, locks, subscriptions
+from ..backends import redis
+from ..backends.database import DatabaseLockBackend
+from ..models import ResourceLock
+from .base import ResourceTreeMixin
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django_redis import get_redis_connection
+from redis.crc import key_slot
+from rest_framework import status
+from unittest import mock
+import time
+
+
+class LockBackendTests(ResourceTreeMixin):
+    # Same locking rules on every engine
+    def lock(self, resource, user, timeout=60):
+        return locks.acquire_lock(
+            resource, timeout, locks.new_lock(user.id, resource.id, timeout)
+        )
+
+    def test_lock_unlock(self):
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lock_code = response.data["lock_code"]
+
+        response = self.client.post(f"/api/v1/resources/{self.child.id}/lock/")
+        self.assertEqual(response.data.get("error"), "Resource is currently locked.")
+
+        response = self.client.get(
+            f"/api/v1/resources/{self.child.id}/", {"include_lock": "true"}
+        )
+        self.assertTrue(response.data["locked"])
+        self.assertEqual(response.data["locked_by"], self.user1.id)
+
+        response = self.client.post(
+            f"/api/v1/resources/{self.child.id}/unlock/", {"lock_code": "fake_code"}
+        )
+        self.assertEqual(response.data.get("error"), "Lock code incorrect.")
+
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.post(
+            f"/api/v1/resources/{self.child.id}/unlock/", {"lock_code": lock_code}
+        )
+        self.assertEqual(
+            response.data.get("error"),
+            "Another user is currently editing this resource.",
+        )
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            f"/api/v1/resources/{self.child.id}/unlock/", {"lock_code": lock_code}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(locks.find_lock(self.child))
+
+    def test_parent_and_child(self):
+        result, lock_data = self.lock(self.parent, self.user1)
+        self.assertEqual(result, locks.OK)
+
+        result, holder = self.lock(self.child, self.user2)
+        self.assertEqual(result, locks.HELD_BY_PARENT)
+        self.assertEqual(holder["id"], self.parent.id)
+        self.assertEqual(locks.find_lock(self.child)["id"], self.parent.id)
+        self.assertEqual(
+            locks.release_lock(self.child, self.user1.id, lock_data["lock_code"]),
+            locks.HELD_BY_PARENT,
+        )
+
+        locks.release_lock(self.parent, self.user1.id, lock_data["lock_code"])
+        self.assertEqual(self.lock(self.child, self.user2)[0], locks.OK)
+        self.assertTrue(locks.has_locked_children(self.parent))
+        self.assertFalse(locks.has_locked_children(self.child))
+
+        result, holder = self.lock(self.parent, self.user1)
+        self.assertEqual(result, locks.HELD_BY_CHILD)
+        self.assertEqual(holder, {"id": self.child.id})
+
+    def test_renew(self):
+        result, lock_data = self.lock(self.child, self.user1, 10)
+        lock_code = lock_data["lock_code"]
+
+        result, renewed = locks.renew_lock(self.child, self.user1.id, lock_code, 600)
+        self.assertEqual(result, locks.OK)
+        self.assertEqual(renewed["lock_code"], lock_code)
+        self.assertGreater(renewed["expires_at"], lock_data["expires_at"])
+        self.assertEqual(locks.find_lock(self.child), renewed)
+
+        self.assertEqual(
+            locks.renew_lock(self.child, self.user2.id, lock_code, 600),
+            (locks.HELD_BY_OTHER_USER, None),
+        )
+        self.assertEqual(
+            locks.renew_lock(self.other, self.user1.id, lock_code, 600),
+            (locks.NOT_LOCKED, None),
+        )
+
+    def test_atomic(self):
+        self.lock(self.other, self.user2)
+        items = [
+            (resource, 60, locks.new_lock(self.user1.id, resource.id, 60))
+            for resource in (self.child, self.other)
+        ]
+
+        results = locks.acquire_locks(items, atomic=True)
+        self.assertEqual([result for result, _ in results], [locks.ABORTED, locks.HELD])
+        # The lock taken before the failure was rolled back
+        self.assertIsNone(locks.find_lock(self.child))
+
+        results = locks.acquire_locks(items)
+        self.assertEqual([result for result, _ in results], [locks.OK, locks.HELD])
+
+        results = locks.release_locks(
+            [(self.child, items[0][2]["lock_code"]), (self.other, "fake_code")],
+            self.user1.id,
+            atomic=True,
+        )
+        self.assertEqual(results, [locks.ABORTED, locks.HELD_BY_OTHER_USER])
+        self.assertIsNotNone(locks.find_lock(self.child))
+
+    def test_check_locks(self):
+        result, lock_data = self.lock(self.parent, self.user1)
+        results = locks.check_locks(
+            [(self.parent, lock_data["lock_code"]), (self.child, "fake_code")],
+            self.user1.id,
+        )
+        self.assertEqual(results, [locks.OK, locks.WRONG_LOCK_CODE])
+        # Nothing is released
+        self.assertEqual(locks.find_lock(self.parent), lock_data)
+
+    def test_find_locks(self):
+        self.lock(self.parent, self.user1)
+        found = locks.find_locks([self.parent, self.child, self.other])
+        self.assertEqual(found[self.parent.id]["id"], self.parent.id)
+        self.assertEqual(found[self.child.id]["id"], self.parent.id)
+        self.assertIsNone(found[self.other.id])
+
+
+@override_settings(
+    RESOURCE_LOCK_BACKEND="apps.resources.backends.redis.RedisLockBackend"
+)
+class RedisLockBackendTest(LockBackendTests, TestCase):
+    def test_hash_tags(self):
+        # Every key a script touches for a resource is in the slot of its tree
+        keys = redis.get_keys(self.child.lineage)
+        self.assertEqual(
+            {key_slot(key.encode()) for key in keys},
+            {key_slot(str(self.parent.id).encode())},
+        )
+
+    def test_renewed_index(self):
+        # Ancestors index the renewed lock until the very moment it expires
+        result, lock_data = self.lock(self.child, self.user1, 10)
+        locks.renew_lock(self.child, self.user1.id, lock_data["lock_code"], 5)
+
+        client = get_redis_connection("default")
+        score = client.zscore(
+            redis.subtree_key(self.parent.id, self.parent.id), self.child.id
+        )
+        expiry = client.pexpiretime(redis.resource_lock_key(self.child))
+        self.assertAlmostEqual(score * 1000, expiry, delta=1)
+
+    def test_server_clock(self):
+        # A worker whose clock runs ahead still sees the live locks of others
+        self.lock(self.child, self.user1)
+        with mock.patch("time.time", return_value=time.time() + 3600):
+            self.assertTrue(locks.has_locked_children(self.parent))
+            result, holder = self.lock(self.parent, self.user2)
+        self.assertEqual(result, locks.HELD_BY_CHILD)
+
+    def test_script_batches(self):
+        # Large batches run as several scripts, atomic ones still all or nothing
+        with mock.patch.object(redis, "SCRIPT_BATCH_SIZE", 2):
+            resources = [self.child, self.other, self.parent]
+            self.assertEqual(redis.split_batch(resources), [[0, 1], [2]])
+
+            items = [
+                (resource, 60, locks.new_lock(self.user1.id, resource.id, 60))
+                for resource in resources
+            ]
+            results = locks.acquire_locks(items, atomic=True)
+            self.assertEqual(
+                [result for result, _ in results],
+                [locks.ABORTED, locks.ABORTED, locks.HELD_BY_CHILD],
+            )
+            self.assertIsNone(locks.find_lock(self.child))
+
+    def test_cluster_url(self):
+        with override_settings(RESOURCE_LOCK_REDIS_CLUSTER=True):
+            with self.assertRaises(ImproperlyConfigured):
+                subscriptions.get_url()
+
+        # A cluster only has database 0, the cache keeps its own
+        with override_settings(
+            RESOURCE_LOCK_REDIS_CLUSTER=True,
+            RESOURCE_LOCK_REDIS_CLUSTER_URL="redis://:pass@node1:7000/1?db=1",
+        ):
+            self.assertEqual(subscriptions.get_url(), "redis://:pass@node1:7000")
+            self.assertEqual(subscriptions.expired_channel(), "__keyevent@0__:expired")
+
+    @override_settings(RESOURCE_LOCK_REDIS_CLUSTER=True)
+    def test_cluster_batches(self):
+        self.assertEqual(
+            redis.split_batch([self.child, self.other, self.parent]), [[0, 2], [1]]
+        )
+
+        client = get_redis_connection("default")
+        with mock.patch.object(redis, "get_cluster_client", return_value=client):
+            self.lock(self.other, self.user2)
+            items = [
+                (resource, 60, locks.new_lock(self.user1.id, resource.id, 60))
+                for resource in (self.child, self.other)
+            ]
+            results = locks.acquire_locks(items, atomic=True)
+            self.assertEqual(
+                [result for result, _ in results], [locks.ABORTED, locks.HELD]
+            )
+            # Taken by the first script call and given back
+            self.assertIsNone(client.get(redis.resource_lock_key(self.child)))
+
+            locks.acquire_locks(items[:1])
+            results = locks.release_locks(
+                [(self.child, items[0][2]["lock_code"]), (self.other, "fake_code")],
+                self.user1.id,
+                atomic=True,
+            )
+            self.assertEqual(results, [locks.ABORTED, locks.HELD_BY_OTHER_USER])
+            self.assertIsNotNone(client.get(redis.resource_lock_key(self.child)))
+
+
+@override_settings(
+    RESOURCE_LOCK_BACKEND="apps.resources.backends.memory.MemoryLockBackend"
+)
+class MemoryLockBackendTest(LockBackendTests, TestCase):
+    def tearDown(self):
+        super().tearDown()
+        backends.get_backend().clear()
+
+    def test_expired_lock(self):
+        result, lock_data = self.lock(self.child, self.user1, -1)
+        self.assertEqual(result, locks.OK)
+        self.assertIsNone(locks.find_lock(self.child))
+        self.assertFalse(locks.has_locked_children(self.parent))
+        self.assertEqual(self.lock(self.parent, self.user2)[0], locks.OK)
+
+
+@override_settings(
+    RESOURCE_LOCK_BACKEND="apps.resources.backends.database.DatabaseLockBackend"
+)
+class DatabaseLockBackendTest(LockBackendTests, TestCase):
+    def setUp(self):
+        # Only set by the settings when the engine is configured
+        options = mock.patch.dict(
+            connection.settings_dict["OPTIONS"], {"transaction_mode": "IMMEDIATE"}
+        )
+        options.start()
+        self.addCleanup(options.stop)
+        super().setUp()
+
+    def test_expired_lock(self):
+        result, lock_data = self.lock(self.child, self.user1, -1)
+        self.assertEqual(result, locks.OK)
+        self.assertIsNone(locks.find_lock(self.child))
+        self.assertFalse(locks.has_locked_children(self.parent))
+        self.assertEqual(self.lock(self.parent, self.user2)[0], locks.OK)
+
+        # Taken over in place
+        self.assertEqual(self.lock(self.child, self.user2, 60)[0], locks.HELD_BY_PARENT)
+        self.assertEqual(ResourceLock.objects.count(), 2)
+
+    def test_moved_child(self):
+        self.lock(self.child, self.user1)
+        self.child.parent = self.other
+        self.child.save()
+
+        self.assertFalse(locks.has_locked_children(self.parent))
+        self.assertTrue(locks.has_locked_children(self.other))
+
+    def test_sqlite_transaction_mode(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        with mock.patch.dict(connection.settings_dict, {"OPTIONS": {}}):
+            with self.assertRaises(ImproperlyConfigured):
+                DatabaseLockBackend()
@@ -0,0 +1,76 @@
+from .. import lock_cache, locks
+from ..backends import redis as redis_backend
+from .base import ResourceTreeMixin
+from django.test import TestCase, override_settings
+from unittest import mock
+import json, redis, time
+
+
+class ResourceLockCacheTest(ResourceTreeMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user1)
+        lock_cache.listener.start()
+        self.assertTrue(lock_cache.listener.ready.wait(5))
+
+    def get_status(self, resource):
+        response = self.client.get(
+            f"/api/v1/resources/{resource.id}/", {"include_lock": "true"}
+        )
+        return response.data["locked"], response.data["inherited_from"]
+
+    def test_cached_status(self):
+        self.assertEqual(self.get_status(self.child), (False, None))
+
+        with mock.patch.object(
+            redis.Redis, "mget", autospec=True, side_effect=redis.Redis.mget
+        ) as mget:
+            self.assertEqual(self.get_status(self.child), (False, None))
+        self.assertEqual(mget.call_count, 0)
+
+        # Lock changes made by this process are seen right away
+        response = self.client.post(f"/api/v1/resources/{self.parent.id}/lock/")
+        self.assertEqual(self.get_status(self.child), (True, self.parent.id))
+
+        self.client.post(
+            f"/api/v1/resources/{self.parent.id}/unlock/",
+            {"lock_code": response.data["lock_code"]},
+        )
+        self.assertEqual(self.get_status(self.child), (False, None))
+
+    def test_broadcast_invalidation(self):
+        self.assertEqual(self.get_status(self.child), (False, None))
+
+        # Lock taken by another process
+        lock_data = locks.new_lock(self.user1.id, self.parent.id, 60)
+        client = redis_backend.get_client()
+        client.set(
+            redis_backend.resource_lock_key(self.parent),
+            redis_backend.encode_lock(lock_data),
+            ex=60,
+        )
+        self.assertEqual(self.get_status(self.child), (False, None))
+        client.publish(
+            redis_backend.EVENTS_CHANNEL,
+            json.dumps({"event": "acquired", "id": self.parent.id}),
+        )
+
+        deadline = time.time() + 5
+        while self.get_status(self.child)[0] is False and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(self.get_status(self.child), (True, self.parent.id))
+
+    def test_expired_lock(self):
+        lock_data = locks.new_lock(self.user1.id, self.parent.id, -1)
+        key = redis_backend.resource_lock_key(self.parent)
+        lock_cache.add_many(
+            {key: redis_backend.encode_lock(lock_data)}, lock_cache.entries.version
+        )
+        self.assertEqual(lock_cache.get_many([key])[1], [key])
+
+    @override_settings(RESOURCE_LOCK_CACHE={"ENABLED": False, "SIZE": 10, "TTL": 5})
+    def test_disabled(self):
+        self.get_status(self.child)
+        self.assertEqual(
+            lock_cache.get_many([redis_backend.resource_lock_key(self.child)])[0], {}
+        )
@@ -0,0 +1,123 @@
+from .. import events, locks
+from ..backends import redis
+from .base import ResourceTreeMixin
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from unittest import mock
+import asyncio
+
+
+class ResourceLockEventsTest(ResourceTreeMixin, TestCase):
+    async def next_event(self, stream):
+        event = None
+        while event is None:
+            event = await asyncio.wait_for(anext(stream), timeout=5)
+        return event
+
+    async def test_subtree_events(self):
+        stream = events.lock_events(subtree=self.parent.id)
+        await anext(stream)
+
+        try:
+            lock = locks.new_lock(self.user1.id, self.other.id, 60)
+            await locks.aacquire_lock(self.other, 60, lock)
+            lock = locks.new_lock(self.user1.id, self.child.id, 60)
+            await locks.aacquire_lock(self.child, 60, lock)
+
+            event = await self.next_event(stream)
+            self.assertEqual(
+                event,
+                {
+                    "event": "acquired",
+                    "id": self.child.id,
+                    "path": self.child.path,
+                    "user_id": self.user1.id,
+                    "expires_at": lock["expires_at"],
+                },
+            )
+
+            await locks.arenew_lock(self.child, self.user1.id, lock["lock_code"], 60)
+            event = await self.next_event(stream)
+            self.assertEqual(event["event"], "renewed")
+
+            await locks.arelease_lock(self.child, self.user1.id, lock["lock_code"])
+            event = await self.next_event(stream)
+            self.assertEqual(event["event"], "released")
+            self.assertEqual(event["id"], self.child.id)
+        finally:
+            await stream.aclose()
+
+    async def test_failed_locks_are_not_published(self):
+        stream = events.lock_events(ids=[self.child.id, self.parent.id])
+        await anext(stream)
+
+        try:
+            lock = locks.new_lock(self.user1.id, self.parent.id, 60)
+            await locks.aacquire_lock(self.parent, 60, lock)
+            await locks.aacquire_locks(
+                [
+                    (self.other, 60, locks.new_lock(self.user1.id, self.other.id, 60)),
+                    (self.child, 60, locks.new_lock(self.user1.id, self.child.id, 60)),
+                ],
+                atomic=True,
+            )
+            await locks.arelease_lock(self.parent, self.user1.id, lock["lock_code"])
+
+            self.assertEqual((await self.next_event(stream))["event"], "acquired")
+            self.assertEqual((await self.next_event(stream))["event"], "released")
+        finally:
+            await stream.aclose()
+
+    @override_settings(
+        RESOURCE_LOCK_REDIS_CLUSTER=True,
+        RESOURCE_LOCK_REDIS_CLUSTER_URL=settings.CACHES["default"]["LOCATION"],
+    )
+    async def test_cluster_events(self):
+        # The cluster client stands in for a cluster, the stream subscribes
+        # through a plain node connection
+        client = get_redis_connection("default")
+        stream = events.lock_events(ids=[self.child.id])
+        await anext(stream)
+
+        try:
+            with mock.patch.object(redis, "get_cluster_client", return_value=client):
+                lock = locks.new_lock(self.user1.id, self.child.id, 60)
+                await sync_to_async(locks.acquire_lock)(self.child, 60, lock)
+
+            event = await self.next_event(stream)
+            self.assertEqual(event["event"], "acquired")
+            self.assertEqual(event["id"], self.child.id)
+        finally:
+            await stream.aclose()
+
+    async def test_expired_event(self):
+        message = {
+            "channel": b"__keyevent@1__:expired",
+            "data": redis.resource_lock_key(self.child).encode(),
+        }
+        self.assertEqual(
+            await events.parse_event(message),
+            {"event": "expired", "id": self.child.id, "path": self.child.path},
+        )
+
+        message["data"] = redis.queue_key(self.child.id, self.parent.id).encode()
+        self.assertIsNone(await events.parse_event(message))
+
+    def test_stream_requests(self):
+        response = self.client.get("/api/v1/async/resources/events/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        token = Token.objects.create(user=self.user1)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        response = self.client.get("/api/v1/async/resources/events/?subtree=abc")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Only streamed by ASGI servers
+        response = self.client.get(
+            f"/api/v1/async/resources/events/?subtree={self.parent.id}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
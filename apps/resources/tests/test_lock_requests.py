@@ -1,3 +1,4 @@
+from .. import ancestry, lock_cache
 from ..models import Resource
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
@@ -147,3 +148,5 @@ class ResourceLockRequestsTest(TestCase):
 
     def tearDown(self):
         cache.clear()
+        ancestry.clear()
+        lock_cache.clear()
@@ -1,7 +1,11 @@
+from .. import ancestry, lock_cache, locks
+from ..backends import redis
 from ..models import Resource
+from concurrent.futures import ThreadPoolExecutor
+import threading, time
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 import uuid
@@ -82,6 +86,90 @@ class ResourceLocksLogicTest(TestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    @override_settings(
+        RESOURCE_LOCKS={
+            "TTL": 3600,
+            "MIN_TTL": 10,
+            "MAX_TTL": 600,
+            "TYPE_TTLS": {"short": 30},
+        }
+    )
+    def test_lock_ttl(self):
+        resource = Resource.objects.create(**self.resource_example)
+        short_resource = Resource.objects.create(
+            **{**self.resource_example, "type": "short"}
+        )
+        client = redis.get_client()
+
+        # Requested timeouts are clamped to the configured bounds
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            f"/api/v1/resources/{resource.id}/lock/", {"ttl": 1}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("expires_at", response.data)
+        self.assertEqual(client.ttl(redis.resource_lock_key(resource)), 10)
+
+        response = self.client.post(
+            f"/api/v1/resources/{resource.id}/renew/",
+            {"lock_code": response.data["lock_code"], "ttl": 100000},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(client.ttl(redis.resource_lock_key(resource)), 600)
+
+        # Per type default timeout
+        response = self.client.post(f"/api/v1/resources/{short_resource.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(client.ttl(redis.resource_lock_key(short_resource)), 30)
+
+    def test_renew(self):
+        resource = Resource.objects.create(**self.resource_example)
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            f"/api/v1/resources/{resource.id}/renew/", {"lock_code": "fake_code"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data.get("error"), "Resource is not locked.")
+
+        response1 = self.client.post(f"/api/v1/resources/{resource.id}/lock/")
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+
+        # Validate when user 2 tries to renew
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.post(
+            f"/api/v1/resources/{resource.id}/renew/",
+            {"lock_code": response1.data["lock_code"]},
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response.data.get("error"),
+            "Another user is currently editing this resource.",
+        )
+
+        # Validate when user tries to renew with wrong lock_code
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            f"/api/v1/resources/{resource.id}/renew/", {"lock_code": "fake_code"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data.get("error"), "Lock code incorrect.")
+
+        # Validate successful renew keeps the same lock_code
+        response = self.client.post(
+            f"/api/v1/resources/{resource.id}/renew/",
+            {"lock_code": response1.data["lock_code"], "ttl": 60},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["lock_code"], response1.data["lock_code"])
+        self.assertLess(response.data["expires_at"], response1.data["expires_at"])
+
+        response = self.client.post(
+            f"/api/v1/resources/{resource.id}/unlock/",
+            {"lock_code": response1.data["lock_code"]},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_locking_child(self):
         self.client.force_authenticate(user=self.user1)
         parent_resource = Resource.objects.create(**self.resource_example)
@@ -122,7 +210,21 @@ class ResourceLocksLogicTest(TestCase):
         self.assertEqual(response1.status_code, status.HTTP_200_OK)
 
         response2 = self.client.post(f"/api/v1/resources/{parent_resource.id}/lock/")
-        self.assertEqual(response2.status_code, status.HTTP_200_OK)
+        self.assertEqual(response2.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response2.data.get("error"),
+            "Child resource is currently locked.",
+        )
+
+        # Parent can be locked once the child is released
+        response3 = self.client.post(
+            f"/api/v1/resources/{child_resource.id}/unlock/",
+            {"lock_code": response1.data["lock_code"]},
+        )
+        self.assertEqual(response3.status_code, status.HTTP_200_OK)
+
+        response4 = self.client.post(f"/api/v1/resources/{parent_resource.id}/lock/")
+        self.assertEqual(response4.status_code, status.HTTP_200_OK)
 
     def test_unlocking_child(self):
         self.client.force_authenticate(user=self.user1)
@@ -230,5 +332,211 @@ class ResourceLocksLogicTest(TestCase):
         )
         self.assertEqual(response2.status_code, status.HTTP_200_OK)
 
+    def test_moving_parent_of_locked_resource(self):
+        self.client.force_authenticate(user=self.user1)
+        parent_resource = Resource.objects.create(**self.resource_example)
+        child_resource_data = {
+            "type": f"Example type {uuid.uuid4()}",
+            "name": f"Example name {uuid.uuid4()}",
+            "content": f"Example content {uuid.uuid4()}",
+            "parent": parent_resource,
+            "created_by": self.user1,
+            "updated_by": self.user1,
+        }
+        child_resource = Resource.objects.create(**child_resource_data)
+        new_parent_data = {
+            "type": f"Example type {uuid.uuid4()}",
+            "name": f"Example name {uuid.uuid4()}",
+            "content": f"Example content {uuid.uuid4()}",
+            "created_by": self.user1,
+            "updated_by": self.user1,
+        }
+        new_parent_resource = Resource.objects.create(**new_parent_data)
+
+        response1 = self.client.post(f"/api/v1/resources/{child_resource.id}/lock/")
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+
+        response2 = self.client.patch(
+            f"/api/v1/resources/{parent_resource.id}/",
+            {"parent": new_parent_resource.id},
+        )
+        self.assertEqual(response2.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response2.data.get("error"),
+            "Cannot move a resource while one of its children is locked.",
+        )
+
+    def test_locking_deep_descendant(self):
+        self.client.force_authenticate(user=self.user1)
+        resources = [Resource.objects.create(**self.resource_example)]
+        for depth in range(20):
+            resources.append(
+                Resource.objects.create(
+                    type=f"Example type {uuid.uuid4()}",
+                    name=f"Example name {uuid.uuid4()}",
+                    content=f"Example content {uuid.uuid4()}",
+                    parent=resources[-1],
+                    created_by=self.user1,
+                    updated_by=self.user1,
+                )
+            )
+
+        response1 = self.client.post(f"/api/v1/resources/{resources[0].id}/lock/")
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+
+        # Ancestry is read from the resource path, whatever the depth
+        with self.assertNumQueries(1):
+            response2 = self.client.post(f"/api/v1/resources/{resources[-1].id}/lock/")
+        self.assertEqual(response2.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response2.data.get("error"),
+            "Parent resource is currently locked.",
+        )
+
+    def test_unlock_after_lock_expired(self):
+        resource = Resource.objects.create(**self.resource_example)
+
+        self.client.force_authenticate(user=self.user1)
+        response1 = self.client.post(f"/api/v1/resources/{resource.id}/lock/")
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+
+        # Lock expires and is taken by user 2
+        cache.clear()
+        self.client.force_authenticate(user=self.user2)
+        response2 = self.client.post(f"/api/v1/resources/{resource.id}/lock/")
+        self.assertEqual(response2.status_code, status.HTTP_200_OK)
+
+        # Stale unlock from user 1 must not release user 2 lock
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            f"/api/v1/resources/{resource.id}/unlock/",
+            {"lock_code": response1.data["lock_code"]},
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response.data.get("error"),
+            "Another user is currently editing this resource.",
+        )
+
+        response = self.client.post(f"/api/v1/resources/{resource.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data.get("error"), "Resource is currently locked.")
+
+    def test_lock_wait_timeout(self):
+        resource = Resource.objects.create(**self.resource_example)
+
+        self.client.force_authenticate(user=self.user1)
+        response1 = self.client.post(f"/api/v1/resources/{resource.id}/lock/")
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(user=self.user2)
+        started = time.monotonic()
+        response = self.client.post(
+            f"/api/v1/resources/{resource.id}/lock/", {"wait": 1}
+        )
+        self.assertGreaterEqual(time.monotonic() - started, 1)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data.get("error"), "Resource is currently locked.")
+
+        # The waiter leaves the queue when it gives up
+        self.assertEqual(
+            redis.get_client().zcard(redis.queue_key(resource.id, resource.id)), 0
+        )
+
+    def test_lock_wait_until_released(self):
+        resource = Resource.objects.create(**self.resource_example)
+        result, lock_data = locks.acquire_lock(
+            resource, 60, locks.new_lock(self.user1.id, resource.id, 60)
+        )
+        self.assertEqual(result, locks.OK)
+
+        release = threading.Timer(
+            0.2,
+            locks.release_lock,
+            [resource, self.user1.id, lock_data["lock_code"]],
+        )
+        release.start()
+        started = time.monotonic()
+        result, lock_data = locks.wait_for_lock(resource, self.user2.id, 60, 5)
+        release.join()
+
+        # Woken up by the release instead of polling
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(result, locks.OK)
+        self.assertEqual(lock_data["user_id"], self.user2.id)
+
+    def test_lock_wait_queue_order(self):
+        resource = Resource.objects.create(**self.resource_example)
+        result, lock_data = locks.acquire_lock(
+            resource, 60, locks.new_lock(self.user1.id, resource.id, 60)
+        )
+
+        # First waiter queues up behind the current holder
+        ticket = f"{time.time() + 60:.3f}:first"
+        item = (resource, 60, locks.new_lock(self.user2.id, resource.id, 60))
+        result, holder = redis.RedisLockBackend().acquire_locks([item], ticket=ticket)[
+            0
+        ]
+        self.assertEqual(result, locks.HELD)
+
+        locks.release_lock(resource, self.user1.id, lock_data["lock_code"])
+
+        # Nobody can jump ahead of the queue once the lock is released
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(f"/api/v1/resources/{resource.id}/lock/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            response.data.get("error"),
+            "Another client is waiting for this resource.",
+        )
+
+        result, holder = redis.RedisLockBackend().acquire_locks([item], ticket=ticket)[
+            0
+        ]
+        self.assertEqual(result, locks.OK)
+        self.assertEqual(
+            redis.get_client().zcard(redis.queue_key(resource.id, resource.id)), 0
+        )
+
+    def test_lock_record_format(self):
+        resource = Resource.objects.create(**self.resource_example)
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(f"/api/v1/resources/{resource.id}/lock/")
+
+        holder = redis.get_client().get(redis.resource_lock_key(resource))
+        self.assertEqual(len(holder), 48)
+        lock_data = redis.decode_lock(holder)
+        self.assertEqual(lock_data["lock_code"], response.data["lock_code"])
+        self.assertEqual(lock_data["expires_at"], response.data["expires_at"])
+        self.assertEqual(redis.encode_lock(lock_data), holder)
+
+    def test_lock_times(self):
+        self.assertEqual(locks.to_iso(0), "1970-01-01T00:00:00+00:00")
+        # Within the fall-back hour of Europe/Lisbon, unambiguous in UTC
+        milliseconds = 1792891800123
+        self.assertEqual(locks.to_iso(milliseconds), "2026-10-25T01:30:00.123000+00:00")
+        self.assertEqual(
+            locks.to_milliseconds(locks.to_iso(milliseconds + 3600000)),
+            milliseconds + 3600000,
+        )
+
+    def test_concurrent_lock_acquisition(self):
+        resource = Resource.objects.create(**self.resource_example)
+
+        def acquire(attempt):
+            lock_data = locks.new_lock(self.user1.id, resource.id, 60)
+            return locks.acquire_lock(resource, 60, lock_data)
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(acquire, range(50)))
+
+        # Exactly one attempt is granted and everyone sees the same holder
+        granted = [holder for result, holder in results if result == locks.OK]
+        self.assertEqual(len(granted), 1)
+        for result, holder in results:
+            self.assertEqual(holder["lock_code"], granted[0]["lock_code"])
+
     def tearDown(self):
         cache.clear()
+        ancestry.clear()
+        lock_cache.clear()
@@ -0,0 +1,103 @@
+from .. import backends, locks
+from .base import ResourceTreeMixin
+from django.test import TestCase, override_settings
+from prometheus_client import REGISTRY
+from rest_framework.authtoken.models import Token
+
+
+@override_settings(
+    RESOURCE_LOCK_BACKEND="apps.resources.backends.memory.MemoryLockBackend"
+)
+class LockMetricsTest(ResourceTreeMixin, TestCase):
+    def tearDown(self):
+        super().tearDown()
+        backends.get_backend().clear()
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_lock_operations(self):
+        ok = self.sample(
+            "resource_lock_operations_total", operation="acquire", result="ok"
+        )
+        held = self.sample(
+            "resource_lock_operations_total",
+            operation="acquire",
+            result="held_by_parent",
+        )
+        calls = self.sample(
+            "resource_lock_operation_seconds_count", operation="acquire"
+        )
+        depths = self.sample("resource_lock_depth_sum")
+
+        locks.acquire_lock(
+            self.parent, 60, locks.new_lock(self.user1.id, self.parent.id, 60)
+        )
+        locks.acquire_lock(
+            self.child, 60, locks.new_lock(self.user1.id, self.child.id, 60)
+        )
+
+        self.assertEqual(
+            self.sample(
+                "resource_lock_operations_total", operation="acquire", result="ok"
+            ),
+            ok + 1,
+        )
+        self.assertEqual(
+            self.sample(
+                "resource_lock_operations_total",
+                operation="acquire",
+                result="held_by_parent",
+            ),
+            held + 1,
+        )
+        self.assertEqual(
+            self.sample("resource_lock_operation_seconds_count", operation="acquire"),
+            calls + 2,
+        )
+        self.assertEqual(self.sample("resource_lock_depth_sum"), depths + 3)
+
+    def test_endpoint(self):
+        self.client.force_authenticate(user=self.user1)
+        self.client.get(f"/api/v1/resources/{self.child.id}/")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"resource_lock_operations_total", response.content)
+        self.assertIn(
+            b'http_request_sql_queries_count{view="resource-detail"}', response.content
+        )
+
+    def test_endpoint_access(self):
+        with override_settings(METRICS={"ALLOWED_IPS": [], "TOKEN": ""}):
+            response = self.client.get("/metrics")
+            self.assertEqual(response.status_code, 403)
+
+        with override_settings(METRICS={"ALLOWED_IPS": [], "TOKEN": "secret"}):
+            response = self.client.get(
+                "/metrics", headers={"Authorization": "Bearer wrong"}
+            )
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get(
+                "/metrics", headers={"Authorization": "Bearer secret"}
+            )
+            self.assertEqual(response.status_code, 200)
+
+    async def test_async_request_queries(self):
+        view = "apps.resources.async_views.lock_status"
+        count = self.sample("http_request_sql_queries_count", view=view)
+        total = self.sample("http_request_sql_queries_sum", view=view)
+        token = await Token.objects.acreate(user=self.user1)
+
+        response = await self.async_client.get(
+            f"/api/v1/async/resources/{self.child.id}/status/",
+            headers={"Authorization": f"Token {token.key}"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.sample("http_request_sql_queries_count", view=view), count + 1
+        )
+        # Queries run in sync_to_async threads are counted too
+        self.assertGreater(
+            self.sample("http_request_sql_queries_sum", view=view), total
+        )
@@ -0,0 +1,52 @@
+from .base import ResourceTreeMixin
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+import json
+
+
+@override_settings(
+    RESOURCE_LOCK_BACKEND="apps.resources.backends.memory.MemoryLockBackend"
+)
+class ProfilingMiddlewareTest(ResourceTreeMixin, TestCase):
+    def get_client(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user1)
+        return client
+
+    def test_disabled(self):
+        response = self.get_client().get(f"/api/v1/resources/{self.other.id}/")
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(REQUEST_PROFILING={"SAMPLE_RATE": 1})
+    def test_profiled(self):
+        with self.assertLogs("apps.resources.profiling", "INFO") as logs:
+            response = self.get_client().post(
+                f"/api/v1/resources/{self.other.id}/lock/"
+            )
+
+        timings = {
+            entry.split(";")[0]: entry
+            for entry in response["Server-Timing"].split(", ")
+        }
+        self.assertEqual(set(timings), {"db", "redis", "cache", "total"})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["action"], "lock")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["db_count"], 0)
+        self.assertIn(f'desc="{record["db_count"]}"', timings["db"])
+
+    @override_settings(REQUEST_PROFILING={"SAMPLE_RATE": 1})
+    async def test_async_profiled(self):
+        token = await Token.objects.acreate(user=self.user1)
+        with self.assertLogs("apps.resources.profiling", "INFO") as logs:
+            response = await self.async_client.get(
+                f"/api/v1/async/resources/{self.other.id}/status/",
+                headers={"Authorization": f"Token {token.key}"},
+            )
+
+        self.assertIn("total;dur=", response["Server-Timing"])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["action"], "lock_status")
+        # Queries run in sync_to_async threads are counted too
+        self.assertGreater(record["db_count"], 0)
@@ -0,0 +1,63 @@
+from .. import ancestry, lock_cache
+from ..management.commands.stress_locks import find_violations
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+import io, json, tempfile
+
+
+class FindViolationsTest(SimpleTestCase):
+    def grant(self, path, granted_at, released_at):
+        return {"path": path, "granted_at": granted_at, "released_at": released_at}
+
+    def test_overlapping_grants(self):
+        grants = [
+            self.grant("1/", 0, 10),
+            # Child of a held resource
+            self.grant("1/2/", 5, 6),
+            # Granted as the first one was released
+            self.grant("1/", 10, 12),
+            # Other tree, and a sibling of the child
+            self.grant("3/", 1, 20),
+            self.grant("1/4/", 11, 13),
+        ]
+        violations = find_violations(grants)
+
+        self.assertEqual(
+            [(item["first"], item["second"]) for item in violations],
+            [(grants[0], grants[1]), (grants[2], grants[4])],
+        )
+
+    def test_sequential_grants(self):
+        grants = [self.grant("1/2/", index, index + 1) for index in range(5)]
+        self.assertEqual(find_violations(grants), [])
+
+
+# Requests are sent as from a server on localhost
+@override_settings(ALLOWED_HOSTS=["localhost"])
+class StressLocksCommandTest(TransactionTestCase):
+    def tearDown(self):
+        cache.clear()
+        ancestry.clear()
+        lock_cache.clear()
+
+    def test_stress(self):
+        out = io.StringIO()
+        with tempfile.NamedTemporaryFile("r") as record:
+            call_command(
+                "stress_locks",
+                trees=1,
+                depth=3,
+                fanout=2,
+                workers=4,
+                duration=0.5,
+                update_ratio=0,
+                seed=1,
+                record=record.name,
+                stdout=out,
+            )
+            report = json.loads(out.getvalue())
+            self.assertGreater(report["grants"], 0)
+            self.assertEqual(report["violations"], [])
+            self.assertEqual(report["failed_releases"], 0)
+            self.assertEqual(len(record.readlines()), report["grants"])
@@ -1,10 +1,12 @@
+from .. import ancestry, lock_cache
 from ..models import Resource
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
-import uuid
+from unittest import mock
+import json, redis, uuid
 
 User = get_user_model()
 
@@ -43,9 +45,16 @@ class ResourceRequestsTest(TestCase):
         # Validate list GET
         response = self.client.get(f"/api/v1/resources/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIsInstance(response.data, list)
-        self.assertEqual(len(response.data), 1)
-        self.assertDictEqual(response.data[0], expected_response)
+        self.assertIsInstance(response.data["results"], list)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertDictEqual(response.data["results"][0], expected_response)
+
+        # Plain array of every resource for clients predating pagination
+        with override_settings(RESOURCE_LIST_UNPAGINATED=True):
+            response = self.client.get("/api/v1/resources/")
+            self.assertEqual(response.data, [expected_response])
+            response = self.client.get("/api/v1/resources/?page_size=1")
+            self.assertEqual(response.data["results"], [expected_response])
 
     def test_successful_post(self):
         self.client.force_authenticate(user=self.user1)
@@ -131,6 +140,216 @@ class ResourceRequestsTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Resource.objects.count(), 0)
 
+    def test_successful_move(self):
+        self.client.force_authenticate(user=self.user1)
+        root1 = Resource.objects.create(**self.resource_example)
+        root2 = Resource.objects.create(
+            type="Root type",
+            name="Root name",
+            content="Root content",
+            created_by=self.user1,
+            updated_by=self.user1,
+        )
+        child = Resource.objects.create(
+            type="Child type",
+            name="Child name",
+            content="Child content",
+            parent=root1,
+            created_by=self.user1,
+            updated_by=self.user1,
+        )
+        grandchild = Resource.objects.create(
+            type="Grandchild type",
+            name="Grandchild name",
+            content="Grandchild content",
+            parent=child,
+            created_by=self.user1,
+            updated_by=self.user1,
+        )
+        self.assertEqual(grandchild.path, f"{root1.id}/{child.id}/{grandchild.id}/")
+
+        response = self.client.patch(
+            f"/api/v1/resources/{child.id}/", {"parent": root2.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["parent"], root2.id)
+
+        # Assert the whole subtree moved
+        grandchild.refresh_from_db()
+        self.assertEqual(grandchild.path, f"{root2.id}/{child.id}/{grandchild.id}/")
+        self.assertEqual(grandchild.lineage, [grandchild.id, child.id, root2.id])
+
+    def test_unsuccessful_move_under_descendant(self):
+        self.client.force_authenticate(user=self.user1)
+        parent = Resource.objects.create(**self.resource_example)
+        child = Resource.objects.create(
+            type="Child type",
+            name="Child name",
+            content="Child content",
+            parent=parent,
+            created_by=self.user1,
+            updated_by=self.user1,
+        )
+
+        response = self.client.patch(
+            f"/api/v1/resources/{parent.id}/", {"parent": child.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIn(
+            "A resource cannot be moved under itself or its descendants.",
+            response.data["error"],
+        )
+        parent.refresh_from_db()
+        self.assertIsNone(parent.parent)
+
+    def test_paginated_list(self):
+        self.client.force_authenticate(user=self.user1)
+        resources = [
+            Resource.objects.create(
+                **{**self.resource_example, "name": f"Example name {index}"}
+            )
+            for index in range(5)
+        ]
+
+        ids = []
+        url = "/api/v1/resources/?page_size=2"
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            ids += [item["id"] for item in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(ids, [resource.id for resource in resources])
+
+        response = self.client.get("/api/v1/resources/?page_size=2&ordering=-id")
+        self.assertEqual(
+            [item["id"] for item in response.data["results"]],
+            [resources[4].id, resources[3].id],
+        )
+
+    def test_list_projection(self):
+        self.client.force_authenticate(user=self.user1)
+        resource = Resource.objects.create(**self.resource_example)
+
+        response = self.client.get("/api/v1/resources/?fields=id,name")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"], [{"id": resource.id, "name": resource.name}]
+        )
+
+        response = self.client.get(f"/api/v1/resources/{resource.id}/?fields=type")
+        self.assertEqual(response.data, {"type": resource.type})
+
+        response = self.client.get("/api/v1/resources/?fields=id,password")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_include_lock(self):
+        self.client.force_authenticate(user=self.user1)
+        parent = Resource.objects.create(**self.resource_example)
+        child = Resource.objects.create(
+            **{**self.resource_example, "name": "Example name 2", "parent": parent}
+        )
+        other = Resource.objects.create(
+            **{**self.resource_example, "name": "Example name 3"}
+        )
+        response = self.client.post(f"/api/v1/resources/{parent.id}/lock/")
+        expires_at = response.data["expires_at"]
+
+        with mock.patch.object(
+            redis.Redis, "mget", autospec=True, side_effect=redis.Redis.mget
+        ) as mget:
+            response = self.client.get(
+                "/api/v1/resources/", {"include_lock": "true", "fields": "id"}
+            )
+        self.assertEqual(mget.call_count, 1)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "id": parent.id,
+                    "locked": True,
+                    "locked_by": self.user1.id,
+                    "expires_at": expires_at,
+                    "inherited_from": None,
+                },
+                {
+                    "id": child.id,
+                    "locked": True,
+                    "locked_by": self.user1.id,
+                    "expires_at": expires_at,
+                    "inherited_from": parent.id,
+                },
+                {
+                    "id": other.id,
+                    "locked": False,
+                    "locked_by": None,
+                    "expires_at": None,
+                    "inherited_from": None,
+                },
+            ],
+        )
+
+        response = self.client.get(
+            f"/api/v1/resources/{child.id}/", {"include_lock": "true"}
+        )
+        self.assertEqual(response.data["inherited_from"], parent.id)
+
+        # Opt-in only
+        response = self.client.get(f"/api/v1/resources/{child.id}/")
+        self.assertNotIn("locked", response.data)
+
+    def test_export(self):
+        self.client.force_authenticate(user=self.user1)
+        first = Resource.objects.create(**self.resource_example)
+        second = Resource.objects.create(
+            **{**self.resource_example, "name": "Example name 2", "parent": first}
+        )
+
+        response = self.client.get("/api/v1/resources/export/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual([row["id"] for row in rows], [first.id, second.id])
+        self.assertEqual(rows[1]["parent"], first.id)
+        self.assertEqual(rows[1]["content"], second.content)
+
+        # Incremental sync from the last exported row
+        response = self.client.get(
+            "/api/v1/resources/export/",
+            {"updated_after": rows[0]["updated_at"], "fields": "id,name"},
+        )
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            rows,
+            [
+                {
+                    "id": second.id,
+                    "name": second.name,
+                    "updated_at": rows[0]["updated_at"],
+                }
+            ],
+        )
+
+        # Sync clients asking for NDJSON
+        response = self.client.get(
+            "/api/v1/resources/export/", HTTP_ACCEPT="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 2)
+
+        response = self.client.get(
+            "/api/v1/resources/export/", {"updated_after": "yesterday"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_unauthorized_access(self):
         resource = Resource.objects.create(**self.resource_example)
 
@@ -156,3 +375,5 @@ class ResourceRequestsTest(TestCase):
 
     def tearDown(self):
         cache.clear()
+        ancestry.clear()
+        lock_cache.clear()
@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import ResourceViewSet
 
 router = DefaultRouter()
@@ -7,4 +8,11 @@ router.register(r"resources", ResourceViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
+    # Async lock endpoints, meant to be served by an ASGI server. The event
+    # stream refuses WSGI requests
+    path("async/resources/<int:pk>/lock/", async_views.lock),
+    path("async/resources/<int:pk>/unlock/", async_views.unlock),
+    path("async/resources/<int:pk>/renew/", async_views.renew),
+    path("async/resources/<int:pk>/status/", async_views.lock_status),
+    path("async/resources/events/", async_views.lock_events),
 ]
@@ -1,16 +1,43 @@
+from . import ancestry, contention, locks
 from .models import Resource
-from .serializers import ResourceSerializer
-from datetime import datetime
-from django.core.cache import cache
+from .pagination import ResourceCursorPagination
+from .renderers import NDJSONRenderer
+from .serializers import (
+    BulkCreateSerializer,
+    BulkDeleteSerializer,
+    BulkLockSerializer,
+    BulkUnlockSerializer,
+    BulkUpdateSerializer,
+    ContentionSerializer,
+    LockSerializer,
+    RenewLockSerializer,
+    ResourceExportSerializer,
+    ResourceSerializer,
+)
 from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
-import json, uuid
+import json
+
+LOCK_ERRORS = {
+    locks.HELD_BY_OTHER_USER: "Another user is currently editing this resource.",
+    locks.WRONG_LOCK_CODE: "Lock code incorrect.",
+    locks.HELD_BY_PARENT: "Parent resource is currently locked.",
+    locks.HELD: "Resource is currently locked.",
+    locks.HELD_BY_CHILD: "Child resource is currently locked.",
+    locks.ABORTED: "Another resource in the batch failed.",
+    locks.NOT_LOCKED: "Resource is not locked.",
+    locks.QUEUED: "Another client is waiting for this resource.",
+}
 
 
 class ResourceViewSet(ModelViewSet):
@@ -18,6 +45,41 @@ class ResourceViewSet(ModelViewSet):
     serializer_class = ResourceSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = ResourceCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_projection()
+        if fields:
+            # Ordering fields stay loaded for the pagination cursor, the path
+            # for the lock state
+            queryset = queryset.only("id", "updated_at", "path", *fields)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fields"] = self.get_projection()
+        context["include_lock"] = self.action in (
+            "list",
+            "retrieve",
+        ) and self.request.query_params.get("include_lock") in ("true", "1")
+        return context
+
+    def get_projection(self):
+        if self.action not in ("list", "retrieve", "export"):
+            return None
+
+        fields = self.request.query_params.get("fields")
+        if not fields:
+            return None
+
+        fields = fields.split(",")
+        unknown = set(fields) - set(ResourceSerializer.Meta.fields)
+        if unknown:
+            raise ValidationError(
+                {"fields": f"Unknown fields: {', '.join(sorted(unknown))}."}
+            )
+        return fields
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user, updated_by=self.request.user)
@@ -34,6 +96,12 @@ class ResourceViewSet(ModelViewSet):
                     self.request.user, resource, request.data.get("lock_code")
                 )
 
+                # Locks of a moved subtree would stay indexed under the old ancestors
+                if "parent" in serializer.validated_data:
+                    parent = serializer.validated_data["parent"]
+                    if getattr(parent, "id", None) != resource.parent_id:
+                        self.check_movable(resource)
+
                 resource = serializer.save()
                 return Response(serializer.data)
         except Exception as e:
@@ -52,71 +120,581 @@ class ResourceViewSet(ModelViewSet):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
 
-    @extend_schema(request=None)
+    @extend_schema(parameters=[ResourceExportSerializer], responses=ResourceSerializer)
+    @action(
+        detail=False, methods=["get"], renderer_classes=[JSONRenderer, NDJSONRenderer]
+    )
+    def export(self, request):
+        serializer = ResourceExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        fields = self.get_projection() or ResourceSerializer.Meta.fields
+
+        queryset = Resource.objects.order_by("updated_at", "id")
+        if "updated_after" in serializer.validated_data:
+            queryset = queryset.filter(
+                updated_at__gt=serializer.validated_data["updated_after"]
+            )
+        if "updated_before" in serializer.validated_data:
+            queryset = queryset.filter(
+                updated_at__lte=serializer.validated_data["updated_before"]
+            )
+
+        # One JSON document per line, read in chunks through a server side cursor
+        rows = queryset.values(*fields, "updated_at").iterator(chunk_size=2000)
+        return StreamingHttpResponse(
+            (self.export_row(row) for row in rows),
+            content_type="application/x-ndjson",
+        )
+
+    def export_row(self, row):
+        # Full precision, the timestamp is the next sync's updated_after
+        row["updated_at"] = row["updated_at"].isoformat()
+        return json.dumps(row) + "\n"
+
+    @extend_schema(parameters=[ContentionSerializer])
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def contention(self, request):
+        serializer = ContentionSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        report = contention.get_report(serializer.validated_data["limit"])
+
+        # Deleted resources keep their counts until the window ends
+        ids = {row["id"] for rows in report.values() for row in rows}
+        paths = dict(Resource.objects.filter(pk__in=ids).values_list("id", "path"))
+        for rows in report.values():
+            for row in rows:
+                row["path"] = paths.get(row["id"])
+        return Response(report)
+
+    @extend_schema(request=LockSerializer)
     @action(detail=True, methods=["post"])
     def lock(self, request, pk=None):
+        serializer = LockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # No transaction, waiting for the lock must not keep one open
         try:
-            with transaction.atomic():
-                lock_data = self.create_lock(self.request.user, self.get_object())
+            lock_data = self.create_lock(
+                self.request.user,
+                self.get_lock_resource(),
+                serializer.validated_data.get("ttl"),
+                serializer.validated_data["wait"],
+            )
 
-                return Response({"lock_code": lock_data.get("lock_code")})
+            return Response(
+                {
+                    "lock_code": lock_data.get("lock_code"),
+                    "expires_at": lock_data.get("expires_at"),
+                }
+            )
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
 
     @extend_schema(request=None)
     @action(detail=True, methods=["post"])
     def unlock(self, request, pk=None):
+        # Lock state only lives in Redis, no transaction needed
+        try:
+            self.remove_lock(
+                self.request.user,
+                self.get_lock_resource(),
+                request.data.get("lock_code"),
+            )
+
+            return Response({"message": "Resource unlocked successfully."})
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+    @extend_schema(request=RenewLockSerializer)
+    @action(detail=True, methods=["post"])
+    def renew(self, request, pk=None):
+        serializer = RenewLockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
         try:
+            lock_data = self.renew_lock(
+                self.request.user,
+                self.get_lock_resource(),
+                serializer.validated_data["lock_code"],
+                serializer.validated_data.get("ttl"),
+            )
+
+            return Response(
+                {
+                    "lock_code": lock_data.get("lock_code"),
+                    "expires_at": lock_data.get("expires_at"),
+                }
+            )
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+    @extend_schema(request=BulkLockSerializer)
+    @action(detail=False, methods=["post"])
+    def bulk_lock(self, request):
+        serializer = BulkLockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+        atomic = serializer.validated_data["atomic"]
+        ttl = serializer.validated_data.get("ttl")
+
+        def lock(resources):
+            return [
+                (
+                    {"lock_code": lock_data.get("lock_code")}
+                    if result == locks.OK
+                    else {"error": LOCK_ERRORS[result]}
+                )
+                for result, lock_data in self.create_locks(
+                    self.request.user, resources, ttl, atomic=atomic
+                )
+            ]
+
+        return self.bulk_response(ids, atomic, lock)
+
+    @extend_schema(request=BulkUnlockSerializer)
+    @action(detail=False, methods=["post"])
+    def bulk_unlock(self, request):
+        serializer = BulkUnlockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["locks"]
+        atomic = serializer.validated_data["atomic"]
+
+        def unlock(resources):
+            found = {resource.id for resource in resources}
+            lock_codes = [
+                item.get("lock_code") for item in items if item["id"] in found
+            ]
+            return [
+                (
+                    {"message": "Resource unlocked successfully."}
+                    if result == locks.OK
+                    else {"error": LOCK_ERRORS[result]}
+                )
+                for result in self.remove_locks(
+                    self.request.user,
+                    list(zip(resources, lock_codes)),
+                    atomic=atomic,
+                )
+            ]
+
+        return self.bulk_response([item["id"] for item in items], atomic, unlock)
+
+    @extend_schema(request=BulkCreateSerializer)
+    @action(detail=False, methods=["post"])
+    def bulk_create(self, request):
+        serializer = BulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        atomic = serializer.validated_data["atomic"]
+
+        items, errors, names = [], [], set()
+        for data in serializer.validated_data["items"]:
+            item = self.get_serializer(data=data)
+            items.append(item)
+            if not item.is_valid():
+                errors.append(item.errors)
+                continue
+
+            # Duplicates within the batch are not in the database yet
+            name = (item.validated_data["type"], item.validated_data["name"])
+            errors.append(
+                {"non_field_errors": ["The fields type, name must make a unique set."]}
+                if name in names
+                else None
+            )
+            names.add(name)
+
+        failed = any(errors)
+        if atomic and failed:
+            errors = [error or LOCK_ERRORS[locks.ABORTED] for error in errors]
+        else:
+            try:
+                with transaction.atomic():
+                    self.create_resources(
+                        [item for item, error in zip(items, errors) if error is None]
+                    )
+            except Exception as e:
+                return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response(
+            {
+                "results": [
+                    {"error": error} if error else item.data
+                    for item, error in zip(items, errors)
+                ]
+            },
+            status=(
+                status.HTTP_403_FORBIDDEN if atomic and failed else status.HTTP_200_OK
+            ),
+        )
+
+    @extend_schema(request=BulkUpdateSerializer)
+    @action(detail=False, methods=["post"])
+    def bulk_update(self, request):
+        serializer = BulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["items"]
+        atomic = serializer.validated_data["atomic"]
+
+        def update(resources):
+            found = {resource.id for resource in resources}
+            items_found = [item for item in items if item["id"] in found]
+            changes = [
+                self.get_serializer(resource, data=item["changes"], partial=True)
+                for resource, item in zip(resources, items_found)
+            ]
+            # Moves change the path of the instances, the locks are released
+            # under the ancestry they were taken with
+            lock_items = [
+                (
+                    Resource(id=resource.id, type=resource.type, path=resource.path),
+                    item.get("lock_code"),
+                )
+                for resource, item in zip(resources, items_found)
+            ]
+            errors = self.check_locks_for_write(
+                lock_items,
+                self.validate_moves(
+                    changes,
+                    self.validate_unique_names(
+                        changes, [self.validate_change(change) for change in changes]
+                    ),
+                ),
+                atomic,
+            )
+
             with transaction.atomic():
-                self.remove_lock(
-                    self.request.user, self.get_object(), request.data.get("lock_code")
+                self.update_resources(
+                    [change for change, error in zip(changes, errors) if error is None]
+                )
+            self.release_written_locks(lock_items, errors)
+            return [
+                {"error": error} if error else change.data
+                for change, error in zip(changes, errors)
+            ]
+
+        try:
+            return self.bulk_response(
+                [item["id"] for item in items], atomic, update, self.get_queryset()
+            )
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+    @extend_schema(request=BulkDeleteSerializer)
+    @action(detail=False, methods=["post"])
+    def bulk_delete(self, request):
+        serializer = BulkDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data["items"]
+        atomic = serializer.validated_data["atomic"]
+
+        def delete(resources):
+            found = {resource.id for resource in resources}
+            lock_codes = [
+                item.get("lock_code") for item in items if item["id"] in found
+            ]
+
+            lock_items = list(zip(resources, lock_codes))
+            errors = self.check_children(
+                resources,
+                self.check_locks_for_write(lock_items, [None] * len(resources), atomic),
+            )
+            if atomic and any(errors):
+                errors = self.abort(errors)
+
+            with transaction.atomic():
+                deleted = Resource.objects.filter(
+                    id__in=[
+                        resource.id
+                        for resource, error in zip(resources, errors)
+                        if error is None
+                    ]
+                )
+                # Detach them first so parents and children can go in one delete
+                deleted.update(parent=None)
+                deleted.delete()
+            self.release_written_locks(lock_items, errors)
+            return [
+                (
+                    {"error": error}
+                    if error
+                    else {"message": "Resource deleted successfully."}
                 )
+                for error in errors
+            ]
 
-                return Response({"message": "Resource unlocked successfully."})
+        try:
+            return self.bulk_response([item["id"] for item in items], atomic, delete)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
 
-    def get_lock(self, resource):
-        lock_data = cache.get(f"resource_lock_{resource.id}")
-        if lock_data:
-            return json.loads(lock_data)
-        elif resource.parent:
-            return self.get_lock(resource.parent)
-        return None
+    def bulk_response(self, ids, atomic, process, queryset=None):
+        # A single query for every resource and its ancestry
+        if queryset is None:
+            resources = self.load_lock_resources(ids)
+        else:
+            resources = queryset.in_bulk(ids)
+        missing = len(resources) < len(set(ids))
+
+        results = iter([])
+        if not (atomic and missing):
+            results = iter(
+                process(
+                    [
+                        resources[resource_id]
+                        for resource_id in ids
+                        if resource_id in resources
+                    ]
+                )
+            )
+
+        items = []
+        for resource_id in ids:
+            if resource_id not in resources:
+                items.append({"id": resource_id, "error": "Resource not found."})
+            elif atomic and missing:
+                items.append({"id": resource_id, "error": LOCK_ERRORS[locks.ABORTED]})
+            else:
+                items.append({"id": resource_id, **next(results)})
+
+        failed = atomic and any("error" in item for item in items)
+        return Response(
+            {"results": items},
+            status=status.HTTP_403_FORBIDDEN if failed else status.HTTP_200_OK,
+        )
 
-    def create_lock(self, user, resource):
-        lock_data = self.get_lock(resource)
+    def get_lock_resource(self):
+        # Lock actions only need the type and the ancestry of the resource
+        pk = self.kwargs["pk"]
+        resource = (
+            self.load_lock_resources([int(pk)]).get(int(pk)) if pk.isdigit() else None
+        )
+        if resource is None:
+            raise Http404("No Resource matches the given query.")
 
-        if lock_data:
-            if lock_data.get("id") != resource.id:
-                raise Exception("Parent resource is currently locked.")
+        self.check_object_permissions(self.request, resource)
+        return resource
+
+    def load_lock_resources(self, ids):
+        queryset = self.get_queryset().only("id", "type", "path")
+        resources, missing = {}, []
+        for resource_id in ids:
+            cached = ancestry.get(resource_id)
+            if cached is None:
+                missing.append(resource_id)
             else:
-                raise Exception("Resource is currently locked.")
+                resources[resource_id] = Resource.from_db(
+                    queryset.db, ["id", "type", "path"], [resource_id, *cached]
+                )
+
+        if missing:
+            since = ancestry.get_version()
+            loaded = queryset.in_bulk(missing)
+            for resource in loaded.values():
+                ancestry.add(resource, since)
+            resources.update(loaded)
+        return resources
+
+    def validate_change(self, change):
+        if not change.is_valid():
+            return change.errors
+
+        try:
+            if self.is_move(change):
+                self.check_movable(change.instance)
+        except Exception as e:
+            return str(e)
+
+    def is_move(self, change):
+        return "parent" in change.validated_data and (
+            getattr(change.validated_data["parent"], "id", None)
+            != change.instance.parent_id
+        )
+
+    def validate_unique_names(self, changes, errors):
+        # Duplicates within the batch are not in the database yet
+        names = set()
+        for index, change in enumerate(changes):
+            if errors[index] is not None:
+                continue
+            data = change.validated_data
+            name = (
+                data.get("type", change.instance.type),
+                data.get("name", change.instance.name),
+            )
+            if name in names:
+                errors[index] = {
+                    "non_field_errors": [
+                        "The fields type, name must make a unique set."
+                    ]
+                }
+            names.add(name)
+        return errors
 
-        lock_data = {
-            "user_id": user.id,
-            "timestamp": datetime.now().isoformat(),
-            "lock_code": str(uuid.uuid4()),
-            "id": resource.id,
+    def validate_moves(self, changes, errors):
+        # Moves are validated against the tree from before the batch, so a
+        # move is refused when an earlier one moves the resource, its new
+        # parent or one of their ancestors, or lands under the resource
+        moves = []
+        for index, change in enumerate(changes):
+            if errors[index] is not None or not self.is_move(change):
+                continue
+            parent = change.validated_data["parent"]
+            lineage = set(change.instance.lineage)
+            if parent is not None:
+                lineage.update(parent.lineage)
+
+            if any(
+                moved_id in lineage or change.instance.id in moved_lineage
+                for moved_id, moved_lineage in moves
+            ):
+                errors[index] = (
+                    "Cannot move a resource within the subtree of another "
+                    "resource moved in the batch."
+                )
+                continue
+            moves.append((change.instance.id, lineage))
+        return errors
+
+    def check_children(self, resources, errors):
+        # Children are protected unless they are deleted along with their
+        # parent, a child that stays keeps its parent and so on up the tree
+        requested = {
+            resource.id for resource, error in zip(resources, errors) if error is None
         }
+        children = list(
+            Resource.objects.filter(parent_id__in=requested).values_list(
+                "id", "parent_id"
+            )
+        )
+        deletable = requested
+        while True:
+            blocked = {
+                parent_id
+                for child_id, parent_id in children
+                if parent_id in deletable and child_id not in deletable
+            }
+            if not blocked:
+                break
+            deletable = deletable - blocked
+        refused = requested - deletable
+
+        return [
+            (
+                "Cannot delete a resource while it has children."
+                if resource.id in refused
+                else error
+            )
+            for resource, error in zip(resources, errors)
+        ]
+
+    def abort(self, errors):
+        return [error or LOCK_ERRORS[locks.ABORTED] for error in errors]
+
+    def check_locks_for_write(self, items, errors, atomic):
+        # Lock codes of every valid item are checked in a single round trip,
+        # the locks are only released once the write is committed
+        if atomic and any(errors):
+            return self.abort(errors)
+
+        valid = [index for index, error in enumerate(errors) if error is None]
+        if valid:
+            results = locks.check_locks(
+                [items[index] for index in valid], self.request.user.id
+            )
+            for index, result in zip(valid, results):
+                if result != locks.OK:
+                    errors[index] = LOCK_ERRORS[result]
+        if atomic and any(errors):
+            return self.abort(errors)
+        return errors
+
+    def release_written_locks(self, items, errors):
+        written = [item for item, error in zip(items, errors) if error is None]
+        if written:
+            self.remove_locks(self.request.user, written)
+
+    def create_resources(self, items):
+        resources = Resource.objects.bulk_create(
+            [
+                Resource(
+                    **item.validated_data,
+                    created_by=self.request.user,
+                    updated_by=self.request.user,
+                )
+                for item in items
+            ],
+            batch_size=1000,
+        )
+
+        # Paths need the ids given by the database
+        for item, resource in zip(items, resources):
+            resource.path = resource.get_path()
+            item.instance = resource
+        Resource.objects.bulk_update(resources, ["path"], batch_size=1000)
+
+    def update_resources(self, changes):
+        now = timezone.now()
+        resources, fields = [], {"updated_at", "updated_by"}
+        for change in changes:
+            if self.is_move(change):
+                # Moves also rewrite the paths of the whole subtree
+                change.save()
+                continue
 
-        cache.set(
-            f"resource_lock_{resource.id}", json.dumps(lock_data), timeout=3600
-        )  # Lock for 1 hour
+            for field, value in change.validated_data.items():
+                setattr(change.instance, field, value)
+            change.instance.updated_at = now
+            change.instance.updated_by = self.request.user
+            fields.update(change.validated_data)
+            resources.append(change.instance)
+
+        Resource.objects.bulk_update(resources, fields, batch_size=1000)
+        if "type" in fields:
+            ancestry.invalidate(ids=[resource.id for resource in resources])
+
+    def check_movable(self, resource):
+        if locks.has_locked_children(resource):
+            raise Exception(
+                "Cannot move a resource while one of its children is locked."
+            )
+
+    def create_lock(self, user, resource, ttl=None, wait=0):
+        if wait:
+            timeout = locks.get_timeout(resource, ttl)
+            result, lock_data = locks.wait_for_lock(resource, user.id, timeout, wait)
+        else:
+            result, lock_data = self.create_locks(user, [resource], ttl)[0]
+
+        if result != locks.OK:
+            raise Exception(LOCK_ERRORS[result])
+
+        return lock_data
+
+    def create_locks(self, user, resources, ttl=None, atomic=False):
+        items = []
+        for resource in resources:
+            timeout = locks.get_timeout(resource, ttl)
+            items.append(
+                (resource, timeout, locks.new_lock(user.id, resource.id, timeout))
+            )
+
+        return locks.acquire_locks(items, atomic=atomic)
+
+    def renew_lock(self, user, resource, lock_code, ttl=None):
+        timeout = locks.get_timeout(resource, ttl)
+        result, lock_data = locks.renew_lock(resource, user.id, lock_code, timeout)
+
+        if result != locks.OK:
+            raise Exception(LOCK_ERRORS[result])
 
         return lock_data
 
     def remove_lock(self, user, resource, lock_code):
-        lock_data = self.get_lock(resource)
-
-        # Ignore if lock is gone
-        if lock_data is None:
-            return
-        elif lock_data.get("user_id") != user.id:
-            raise Exception("Another user is currently editing this resource.")
-        elif lock_data.get("lock_code") != lock_code:
-            raise Exception("Lock code incorrect.")
-        elif lock_data.get("id") != resource.id:
-            raise Exception("Parent resource is currently locked.")
-
-        cache.delete(f"resource_lock_{resource.id}")
+        result = self.remove_locks(user, [(resource, lock_code)])[0]
+
+        # Released, or ignored if lock is gone
+        if result != locks.OK:
+            raise Exception(LOCK_ERRORS[result])
+
+    def remove_locks(self, user, items, atomic=False):
+        return locks.release_locks(items, user.id, atomic=atomic)
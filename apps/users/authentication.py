@@ -0,0 +1,60 @@
+from apps.resources import profiling
+from apps.resources.local_cache import LocalCache
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+
+local_tokens = LocalCache()
+
+
+def token_cache_key(key):
+    return f"auth_token_{key}"
+
+
+def get_cached_user(key):
+    config = settings.AUTH_TOKEN_CACHE
+    fields = local_tokens.get(key)
+    if fields is None:
+        with profiling.span("cache"):
+            fields = cache.get(token_cache_key(key))
+        if fields is None:
+            return None
+        local_tokens.set(key, fields, config["LOCAL_TTL"], config["LOCAL_SIZE"])
+
+    # The password hash is never cached, it stays deferred on the instance so
+    # saving the user cannot overwrite it
+    return User.from_db("default", list(fields), list(fields.values()))
+
+
+def cache_user(key, user):
+    config = settings.AUTH_TOKEN_CACHE
+    fields = {
+        field.attname: getattr(user, field.attname)
+        for field in User._meta.concrete_fields
+        if field.attname != "password"
+    }
+    with profiling.span("cache"):
+        cache.set(token_cache_key(key), fields, config["TTL"])
+    local_tokens.set(key, fields, config["LOCAL_TTL"], config["LOCAL_SIZE"])
+
+
+def invalidate_token(key):
+    with profiling.span("cache"):
+        cache.delete(token_cache_key(key))
+    local_tokens.delete(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        user = get_cached_user(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+
+        user, token = super().authenticate_credentials(key)
+        cache_user(key, user)
+        return user, token
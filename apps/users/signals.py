@@ -0,0 +1,19 @@
+from .authentication import invalidate_token
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    # Deactivated users and changed permissions must not outlive the cache
+    for key in Token.objects.filter(user=instance).values_list("key", flat=True):
+        invalidate_token(key)
@@ -1,9 +1,15 @@
+from .authentication import CachedTokenAuthentication, local_tokens
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework.exceptions import ErrorDetail
 import uuid
 
+User = get_user_model()
+
 
 class UsersAPITestCase(TestCase):
     def setUp(self):
@@ -198,3 +204,57 @@ class UsersAPITestCase(TestCase):
                 )
             ],
         )
+
+
+class CachedTokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="user1", password="password1", email="test1@test.com"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_cached_token(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/v1/resources/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Only the list query is left
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/v1/resources/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Also shared through Redis
+        local_tokens.delete(self.token.key)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/v1/resources/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cached_user_password(self):
+        self.client.get("/api/v1/resources/")
+        user, _ = CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+
+        user.first_name = "Name"
+        user.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("password1"))
+
+    def test_deactivated_user(self):
+        self.client.get("/api/v1/resources/")
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get("/api/v1/resources/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token(self):
+        self.client.get("/api/v1/resources/")
+        self.token.delete()
+
+        response = self.client.get("/api/v1/resources/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def tearDown(self):
+        cache.clear()
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "apps.resources.profiling.profiling_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -53,12 +54,13 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "apps.resources.metrics.query_count_middleware",
 ]
 
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "apps.users.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
@@ -115,6 +117,100 @@ CACHES = {
     }
 }
 
+# Resource locks
+# Timeouts in seconds, requested timeouts are clamped between MIN_TTL and MAX_TTL
+RESOURCE_LOCKS = {
+    "TTL": env.int("RESOURCE_LOCK_TTL", default=3600),
+    "MIN_TTL": env.int("RESOURCE_LOCK_MIN_TTL", default=5),
+    "MAX_TTL": env.int("RESOURCE_LOCK_MAX_TTL", default=86400),
+    # Default timeout per resource type, e.g. {"document": 30}
+    "TYPE_TTLS": env.json("RESOURCE_LOCK_TYPE_TTLS", default={}),
+    # Longest time a lock request may wait for a locked resource
+    "MAX_WAIT": env.int("RESOURCE_LOCK_MAX_WAIT", default=30),
+}
+
+# Most items of a bulk lock or unlock request, and of a bulk create, update or
+# delete request. Lock scripts run over at most 500 resources at a time
+RESOURCE_BULK_MAX_ITEMS = env.int("RESOURCE_BULK_MAX_ITEMS", default=500)
+RESOURCE_BULK_MAX_WRITE_ITEMS = env.int("RESOURCE_BULK_MAX_WRITE_ITEMS", default=10000)
+
+# Lock engine, apps.resources.backends.redis.RedisLockBackend,
+# apps.resources.backends.database.DatabaseLockBackend for deployments without
+# Redis or apps.resources.backends.memory.MemoryLockBackend for a single process
+RESOURCE_LOCK_BACKEND = env.str(
+    "RESOURCE_LOCK_BACKEND", default="apps.resources.backends.redis.RedisLockBackend"
+)
+
+if (
+    RESOURCE_LOCK_BACKEND == "apps.resources.backends.database.DatabaseLockBackend"
+    and DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3"
+):
+    # The database lock engine needs transactions that take the write lock
+    # when they begin, concurrent writers then wait up to timeout seconds for
+    # each other instead of failing with "database is locked"
+    options = DATABASES["default"].setdefault("OPTIONS", {})
+    options.setdefault("transaction_mode", "IMMEDIATE")
+    options.setdefault("timeout", 20)
+
+# Redis Cluster for the Redis lock engine, seeded from the node at CLUSTER_URL.
+# Lock keys are hash tagged by tree so hierarchical checks stay atomic. The
+# cache and the token cache are not cluster aware, REDIS_HOST then has to stay
+# a standalone Redis
+RESOURCE_LOCK_REDIS_CLUSTER = env.bool("RESOURCE_LOCK_REDIS_CLUSTER", default=False)
+RESOURCE_LOCK_REDIS_CLUSTER_URL = env.str("RESOURCE_LOCK_REDIS_CLUSTER_URL", default="")
+
+# Per process near cache of the lock records read by lock status checks,
+# entries live at most TTL seconds
+RESOURCE_LOCK_CACHE = {
+    "ENABLED": env.bool("RESOURCE_LOCK_CACHE_ENABLED", default=True),
+    "SIZE": env.int("RESOURCE_LOCK_CACHE_SIZE", default=100000),
+    "TTL": env.int("RESOURCE_LOCK_CACHE_TTL", default=5),
+}
+
+# Lock conflicts per resource and per subtree, counted in Redis count-min
+# sketches of DEPTH rows of WIDTH counters, the SIZE most contended of each
+# are listed by the contention report. Counts start over every WINDOW seconds.
+# Only tracked with the Redis lock engine
+RESOURCE_LOCK_CONTENTION = {
+    "ENABLED": env.bool("RESOURCE_LOCK_CONTENTION_ENABLED", default=True),
+    "WIDTH": env.int("RESOURCE_LOCK_CONTENTION_WIDTH", default=2048),
+    "DEPTH": env.int("RESOURCE_LOCK_CONTENTION_DEPTH", default=4),
+    "SIZE": env.int("RESOURCE_LOCK_CONTENTION_SIZE", default=100),
+    "WINDOW": env.int("RESOURCE_LOCK_CONTENTION_WINDOW", default=3600),
+}
+
+# Resource lists are cursor paginated. True restores the plain array of every
+# resource for clients predating pagination, unless they request a page
+RESOURCE_LIST_UNPAGINATED = env.bool("RESOURCE_LIST_UNPAGINATED", default=False)
+
+# Per process cache of the type and ancestry of the locked resources
+RESOURCE_ANCESTRY_CACHE = {
+    "SIZE": env.int("RESOURCE_ANCESTRY_CACHE_SIZE", default=100000),
+    "TTL": env.int("RESOURCE_ANCESTRY_CACHE_TTL", default=300),
+}
+
+# Token authentication cache
+# Seconds a token is cached in Redis and in each process, the process cache is
+# not invalidated across processes so it is kept short
+AUTH_TOKEN_CACHE = {
+    "TTL": env.int("AUTH_TOKEN_CACHE_TTL", default=300),
+    "LOCAL_TTL": env.int("AUTH_TOKEN_CACHE_LOCAL_TTL", default=10),
+    "LOCAL_SIZE": env.int("AUTH_TOKEN_CACHE_LOCAL_SIZE", default=10000),
+}
+
+# Opt-in request profiling, share of the requests whose queries, Redis and
+# cache calls are counted and timed, 0 disables it
+REQUEST_PROFILING = {
+    "SAMPLE_RATE": env.float("REQUEST_PROFILING_SAMPLE_RATE", default=0),
+}
+
+# Prometheus metrics endpoint, only served to the listed client addresses or
+# to scrapers sending the token as "Authorization: Bearer <token>"
+METRICS = {
+    "ALLOWED_IPS": env.list("METRICS_ALLOWED_IPS", default=["127.0.0.1", "::1"]),
+    "TOKEN": env.str("METRICS_TOKEN", default=""),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -1,3 +1,4 @@
+from apps.resources.metrics import metrics_view
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import (
@@ -13,4 +14,5 @@ urlpatterns = [
     path("schema", SpectacularAPIView.as_view(), name="schema"),
     path("docs", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path("redoc", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
+    path("metrics", metrics_view, name="metrics"),
 ]